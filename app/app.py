@@ -16,9 +16,9 @@ if not usuarios.verificar_autenticacion():
     usuarios.mostrar_login()
     st.stop()
 
-from src.data_loader_sheets import DataLoaderSheets as DataLoader
-from src.inventory_analyzer import InventoryAnalyzer
-from config.settings import COMPANY_INFO
+from src.inventory_service import get_inventory_analysis, invalidate_datasets
+from src.material_search import buscar_materiales, buscar_materiales_pagina
+from config.settings import COMPANY_INFO, SEARCH_PAGE_SIZE
 import pandas as pd
 
 st.set_page_config(
@@ -75,7 +75,8 @@ with st.sidebar:
     st.info("Datos sincronizados con Google Sheets")
     
     if st.button("Actualizar Datos", use_container_width=True):
-        st.cache_data.clear()
+        # Solo el inventario; el historial de SOLPEDs sigue en cache
+        invalidate_datasets('sap', 'parametros')
         st.rerun()
     
     st.caption("Los cambios se guardan automaticamente")
@@ -88,40 +89,9 @@ with st.sidebar:
     st.markdown("Web: " + COMPANY_INFO['website'])
     st.markdown("WhatsApp: " + COMPANY_INFO['whatsapp'])
 
-def buscar_material(df, termino):
-    if not termino:
-        return df
-    t = termino.lower().strip()
-    
-    mask = (
-        df['codigo'].astype(str).str.lower().str.contains(t, na=False) |
-        df['descripcion'].astype(str).str.lower().str.contains(t, na=False)
-    )
-    
-    if 'nombre_tecnico' in df.columns:
-        mask = mask | df['nombre_tecnico'].astype(str).str.lower().str.contains(t, na=False)
-    
-    if 'ubicacion' in df.columns:
-        mask = mask | df['ubicacion'].astype(str).str.lower().str.contains(t, na=False)
-    
-    if 'centro' in df.columns:
-        mask = mask | df['centro'].astype(str).str.lower().str.contains(t, na=False)
-    
-    if 'centro_nombre' in df.columns:
-        mask = mask | df['centro_nombre'].astype(str).str.lower().str.contains(t, na=False)
-    
-    return df[mask]
-
-@st.cache_data(ttl=300)
 def load_data():
-    loader = DataLoader()
-    data = loader.merge_data()
-    if data.empty:
-        return None, None
-    analyzer = InventoryAnalyzer(data)
-    analysis = analyzer.full_analysis()
-    metrics = analyzer.get_summary_metrics()
-    return analysis, metrics
+    """Inventario analizado (memoria/snapshot; se revalida si las hojas cambian)"""
+    return get_inventory_analysis()
 
 try:
     df, metrics = load_data()
@@ -144,10 +114,24 @@ try:
         btn_buscar = st.button("Buscar", use_container_width=True)
     
     if termino:
-        resultados = buscar_material(df, termino)
+        por_pagina = SEARCH_PAGE_SIZE['tablero']
+        clave_pagina = 'pagina_busqueda_' + termino
+        pagina = st.session_state.get(clave_pagina, 1)
+        resultados, total = buscar_materiales_pagina('analisis', termino, por_pagina, pagina - 1)
+        
+        if total and resultados.empty:
+            # La pagina elegida ya no existe (los datos cambiaron)
+            pagina = 1
+            st.session_state[clave_pagina] = 1
+            resultados, total = buscar_materiales_pagina('analisis', termino, por_pagina, 0)
         
-        if not resultados.empty:
-            st.success("Encontrados: " + str(len(resultados)) + " materiales")
+        if total:
+            paginas = (total + por_pagina - 1) // por_pagina
+            desde = (pagina - 1) * por_pagina
+            st.success(
+                "Encontrados: " + str(total) + " materiales (mostrando " +
+                str(desde + 1) + "-" + str(desde + len(resultados)) + ", los mas relevantes primero)"
+            )
             
             cols_d = ['codigo', 'descripcion', 'nombre_tecnico', 'centro', 'centro_nombre', 'ubicacion',
                      'stock_actual', 'stock_minimo', 'stock_maximo', 'estado', 
@@ -157,14 +141,33 @@ try:
             
             st.dataframe(resultados[cols_exist], use_container_width=True, height=400)
             
-            csv_r = resultados.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                "Descargar Resultados",
-                csv_r,
-                "busqueda_" + termino + ".csv",
-                "text/csv",
-                use_container_width=True
-            )
+            col_p1, col_p2 = st.columns([1, 3])
+            with col_p1:
+                if paginas > 1:
+                    st.number_input(
+                        "Pagina (de " + str(paginas) + ")",
+                        min_value=1,
+                        max_value=paginas,
+                        step=1,
+                        key=clave_pagina
+                    )
+            with col_p2:
+                # El CSV con todas las coincidencias se arma solo si se pide,
+                # una vez por busqueda (no en cada rerun)
+                clave_csv = (termino, total)
+                if st.button("Preparar CSV (" + str(total) + " materiales)", use_container_width=True):
+                    csv_r = buscar_materiales('analisis', termino).to_csv(index=False).encode('utf-8')
+                    st.session_state.csv_busqueda = (clave_csv, csv_r)
+                
+                csv_guardado = st.session_state.get('csv_busqueda')
+                if csv_guardado is not None and csv_guardado[0] == clave_csv:
+                    st.download_button(
+                        "Descargar Resultados",
+                        csv_guardado[1],
+                        "busqueda_" + termino + ".csv",
+                        "text/csv",
+                        use_container_width=True
+                    )
             st.markdown("---")
         else:
             st.warning("No se encontraron materiales con: " + termino)
@@ -12,6 +12,9 @@ import pandas as pd
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from src.data_loader_sheets import DataLoaderSheets as DataLoader
+from src.inventory_service import get_dataset, invalidate_datasets, apply_parameter_patches
+from src.material_search import buscar_materiales_pagina
+from config.settings import SEARCH_PAGE_SIZE
 
 st.set_page_config(
     page_title="Configuracion - JAC Engineering",
@@ -24,8 +27,8 @@ st.markdown("JAC Engineering SAS")
 st.markdown("---")
 
 def load_params():
-    loader = DataLoader()
-    df = loader.load_parameters()
+    # Copia: el dataset en cache es compartido por todas las sesiones
+    df = get_dataset('parametros', wait=True).copy()
     
     if df.empty:
         return pd.DataFrame()
@@ -62,6 +65,11 @@ if 'observaciones' not in df_params.columns:
 
 st.info("Total de registros configurados: " + str(len(df_params)))
 
+if 'config_guardado' in st.session_state:
+    st.success("✅ GUARDADO EXITOSO")
+    st.info(st.session_state.pop('config_guardado'))
+    st.balloons()
+
 # ============================================================
 # BÚSQUEDA
 # ============================================================
@@ -84,22 +92,22 @@ with col_search2:
 # ============================================================
 
 if busqueda:
-    termino = busqueda.lower().strip()
-    
-    mask = (
-        df_params['codigo'].astype(str).str.lower().str.contains(termino, na=False) |
-        df_params['descripcion'].astype(str).str.lower().str.contains(termino, na=False)
-    )
-    
-    if 'nombre_tecnico' in df_params.columns:
-        mask = mask | df_params['nombre_tecnico'].astype(str).str.lower().str.contains(termino, na=False)
-    
-    df_filtrado = df_params[mask].copy()
+    # Indice compartido del dataset; se toman las mismas filas de df_params,
+    # en orden de relevancia y como maximo una pagina para el selector
+    por_pagina = SEARCH_PAGE_SIZE['configuracion']
+    encontrados, total = buscar_materiales_pagina('parametros', busqueda, por_pagina)
+    df_filtrado = df_params.loc[encontrados.index[encontrados.index.isin(df_params.index)]].copy()
     
     if df_filtrado.empty:
         st.warning("No se encontraron materiales con: " + busqueda)
     else:
-        st.success("Encontrados: " + str(len(df_filtrado)) + " materiales")
+        st.success("Encontrados: " + str(total) + " materiales")
+        
+        if total > por_pagina:
+            st.info(
+                "Se muestran los " + str(por_pagina) + " mas relevantes. "
+                "Escribe un codigo o descripcion mas especifica para ver los demas."
+            )
         
         # Construir opciones del selector
         opciones = []
@@ -391,19 +399,44 @@ if busqueda:
                         
                         st.write("Escribiendo en Google Sheets...")
                         
+                        # Solo las filas editadas: todos los centros del codigo
+                        # (campos globales) y el centro seleccionado (stocks)
+                        patches = []
+                        for centro in df_params.loc[mask_global, 'centro'].astype(str).unique():
+                            patch = {
+                                'codigo': codigo_mat,
+                                'centro': centro,
+                                'nombre_tecnico': nuevo_nombre_tecnico,
+                                'Categoria': nueva_categoria,
+                                'observaciones': nuevas_observaciones
+                            }
+                            if centro == centro_mat:
+                                patch.update({
+                                    'stock_minimo': int(nuevo_stock_minimo),
+                                    'stock_maximo': int(nuevo_stock_maximo),
+                                    'lead_time': int(nuevo_lead_time),
+                                    'consumo_mensual': float(nuevo_consumo),
+                                    'criticidad': nueva_criticidad,
+                                    'proveedor': nuevo_proveedor
+                                })
+                            patches.append(patch)
+                        
                         loader = DataLoader()
                         
                         try:
-                            success = loader.save_parameters(df_params)
+                            success = loader.save_parameter_patches(patches)
                             
                             if success:
-                                st.success("✅ GUARDADO EXITOSO")
-                                st.info("Stock Mín: " + str(nuevo_stock_minimo) + " | Stock Máx: " + str(nuevo_stock_maximo))
-                                st.balloons()
-                                st.cache_data.clear()
+                                # Parche en memoria de parametros, inventario y analisis;
+                                # si no se puede, las demas sesiones siguen con el inventario
+                                # anterior hasta que termine la reconstruccion
+                                if not apply_parameter_patches(patches):
+                                    invalidate_datasets('parametros', keep_previous=True)
                                 
-                                import time
-                                time.sleep(2)
+                                # El mensaje se muestra despues del rerun
+                                st.session_state.config_guardado = (
+                                    "Stock Mín: " + str(nuevo_stock_minimo) + " | Stock Máx: " + str(nuevo_stock_maximo)
+                                )
                                 st.rerun()
                             else:
                                 st.error("❌ ERROR: No se pudo guardar en Google Sheets")
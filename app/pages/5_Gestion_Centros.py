@@ -10,8 +10,7 @@ import pandas as pd
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from src.data_loader_sheets import DataLoaderSheets as DataLoader
-from src.inventory_analyzer import InventoryAnalyzer
+from src.inventory_service import get_inventory_analysis
 
 st.set_page_config(
     page_title="Gestion Centros - JAC Engineering",
@@ -23,14 +22,10 @@ st.title("🏭 Gestion por Centros de Costo")
 st.markdown("JAC Engineering SAS - Analisis individual por bodega")
 st.markdown("---")
 
-@st.cache_data(ttl=300)
 def load_data():
-    loader = DataLoader()
-    data = loader.merge_data()
-    if data.empty:
-        return None
-    analyzer = InventoryAnalyzer(data)
-    return analyzer.full_analysis()
+    """Inventario analizado (memoria/snapshot; se revalida si las hojas cambian)"""
+    analysis, metrics = get_inventory_analysis()
+    return analysis
 
 df = load_data()
 
@@ -100,7 +95,7 @@ st.markdown("---")
 if categoria_seleccionada == 'Todas' and 'Categoria' in df_centro.columns:
     st.markdown("### Resumen por Categoria")
     
-    resumen_cat = df_centro.groupby('Categoria').agg({
+    resumen_cat = df_centro.groupby('Categoria', observed=True).agg({
         'codigo': 'count',
         'estado': lambda x: (x == 'CRITICO').sum()
     }).reset_index()
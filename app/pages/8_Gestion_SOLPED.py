@@ -12,8 +12,12 @@ from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from src.google_sheets_handler import GoogleSheetsHandler
+from src.google_sheets_handler import get_sheets_handler
+from src.solped_counter import SolpedCounter
+from src.inventory_service import get_dataset, invalidate_datasets
+from src.material_search import buscar_materiales_pagina
 from config.google_config import SHEETS_CONFIG
+from config.settings import SEARCH_PAGE_SIZE
 
 st.set_page_config(
     page_title="Gestion SOLPED - JAC Engineering",
@@ -25,32 +29,36 @@ st.title("📋 Gestion de Solicitudes de Pedido (SOLPED)")
 st.markdown("JAC Engineering SAS - Control de compras con carrito multi-material")
 st.markdown("---")
 
+# Columnas de JAC_SOLPED_Historico (en el orden de la hoja)
+SOLPED_COLUMNS = [
+    'SOLPED_Numero', 'Fecha', 'Codigo', 'Descripcion',
+    'Nombre_Tecnico', 'Centro', 'Centro_Nombre',
+    'Cantidad_Solicitada', 'Unidad', 'Precio_Unitario',
+    'Valor_Total', 'Criticidad', 'Proveedor',
+    'Solicitado_Por', 'Estado', 'Notas'
+]
+
 # ============================================================
 # FUNCIONES DE GOOGLE SHEETS
 # ============================================================
 
 def get_handler():
-    return GoogleSheetsHandler()
+    return get_sheets_handler()
 
-def load_solped_from_sheets():
-    """Carga historial de SOLPEDs desde Google Sheets"""
+def load_solped_from_sheets(columns=None):
+    """
+    Historial de SOLPEDs (dataset compartido en cache)
+    columns: lista opcional de columnas a devolver
+    """
     try:
-        handler = get_handler()
-        config = SHEETS_CONFIG['solped']
+        df = get_dataset('solped')
         
-        df = handler.read_sheet_to_dataframe(
-            config['sheet_id'],
-            config['sheet_name']
-        )
+        if columns is not None:
+            # Copia de las columnas pedidas: el dataset compartido no se modifica
+            df = df[[c for c in columns if c in df.columns]].copy()
         
         if df.empty:
-            return pd.DataFrame(columns=[
-                'SOLPED_Numero', 'Fecha', 'Codigo', 'Descripcion',
-                'Nombre_Tecnico', 'Centro', 'Centro_Nombre',
-                'Cantidad_Solicitada', 'Unidad', 'Precio_Unitario',
-                'Valor_Total', 'Criticidad', 'Proveedor',
-                'Solicitado_Por', 'Estado', 'Notas'
-            ])
+            return pd.DataFrame(columns=columns or SOLPED_COLUMNS)
         
         return df
         
@@ -58,59 +66,44 @@ def load_solped_from_sheets():
         st.error("Error cargando SOLPEDs: " + str(e))
         return pd.DataFrame()
 
-def save_solped_to_sheets(df):
-    """Guarda SOLPEDs en Google Sheets"""
+def append_solped_to_sheets(df_nuevas):
+    """Agrega solo las lineas nuevas al historial de SOLPEDs"""
     try:
         handler = get_handler()
         config = SHEETS_CONFIG['solped']
         
+        # Esquema: mismas columnas que la hoja, en el mismo orden
+        faltantes = [c for c in SOLPED_COLUMNS if c not in df_nuevas.columns]
+        if faltantes:
+            st.error("Faltan columnas en la SOLPED: " + ", ".join(faltantes))
+            return False
+        
         # Limpiar datos antes de guardar
-        df_save = df.copy()
+        df_save = df_nuevas[SOLPED_COLUMNS].copy()
         df_save = df_save.fillna('')
         df_save = df_save.astype(str)
         df_save = df_save.replace('nan', '')
         
-        success = handler.write_dataframe_to_sheet(
+        success = handler.append_rows_to_sheet(
             df_save,
             config['sheet_id'],
-            config['sheet_name']
+            config['sheet_name'],
+            match_header=True
         )
         
+        if success:
+            invalidate_datasets('solped')
+        
         return success
         
     except Exception as e:
         st.error("Error guardando SOLPEDs: " + str(e))
         return False
 
-def get_next_solped_number(df_solped):
-    """Genera el siguiente numero de SOLPED"""
-    if df_solped.empty or 'SOLPED_Numero' not in df_solped.columns:
-        return "SOLPED-2026-001"
-    
-    try:
-        numeros = df_solped['SOLPED_Numero'].dropna().tolist()
-        if not numeros:
-            return "SOLPED-2026-001"
-        
-        # Extraer el numero secuencial del ultimo
-        ultimo = str(numeros[-1])
-        partes = ultimo.split('-')
-        if len(partes) == 3:
-            anio = datetime.now().year
-            num = int(partes[-1]) + 1
-            return "SOLPED-" + str(anio) + "-" + str(num).zfill(3)
-        else:
-            return "SOLPED-" + str(datetime.now().year) + "-" + str(len(numeros) + 1).zfill(3)
-    except:
-        return "SOLPED-" + str(datetime.now().year) + "-001"
-
 def load_inventory():
     """Carga inventario para seleccionar materiales"""
     try:
-        from src.data_loader_sheets import DataLoaderSheets
-        loader = DataLoaderSheets()
-        df = loader.merge_data()
-        return df
+        return get_dataset('inventario')
     except Exception as e:
         st.error("Error cargando inventario: " + str(e))
         return pd.DataFrame()
@@ -187,25 +180,35 @@ with tab1:
             df_inventario = load_inventory()
         
         if not df_inventario.empty:
-            termino = busqueda.lower().strip()
+            por_pagina = SEARCH_PAGE_SIZE['solped']
+            clave_pagina = 'pagina_solped_' + busqueda
+            pagina = st.session_state.get(clave_pagina, 1)
+            df_resultado, total = buscar_materiales_pagina('inventario', busqueda, por_pagina, pagina - 1)
             
-            mask = (
-                df_inventario['codigo'].astype(str).str.lower().str.contains(termino, na=False) |
-                df_inventario['descripcion'].astype(str).str.lower().str.contains(termino, na=False)
-            )
+            if total and df_resultado.empty:
+                # La pagina elegida ya no existe (los datos cambiaron)
+                st.session_state[clave_pagina] = 1
+                df_resultado, total = buscar_materiales_pagina('inventario', busqueda, por_pagina, 0)
             
-            if 'nombre_tecnico' in df_inventario.columns:
-                mask = mask | df_inventario['nombre_tecnico'].astype(str).str.lower().str.contains(termino, na=False)
-            
-            df_resultado = df_inventario[mask].copy()
+            df_resultado = df_resultado.copy()
             
             if df_resultado.empty:
                 st.warning("No se encontraron materiales con: " + busqueda)
             else:
-                st.success("Encontrados: " + str(len(df_resultado)) + " materiales")
+                st.success("Encontrados: " + str(total) + " materiales (los mas relevantes primero)")
+                
+                paginas = (total + por_pagina - 1) // por_pagina
+                if paginas > 1:
+                    st.number_input(
+                        "Pagina (de " + str(paginas) + ")",
+                        min_value=1,
+                        max_value=paginas,
+                        step=1,
+                        key=clave_pagina
+                    )
                 
                 # Mostrar resultados
-                for idx, row in df_resultado.head(10).iterrows():
+                for idx, row in df_resultado.iterrows():
                     with st.expander(
                         str(row['codigo']) + " - " + str(row['descripcion'])[:60] + " | Centro: " + str(row.get('centro', '')) + " | Stock: " + str(row.get('stock_actual', 0))
                     ):
@@ -369,11 +372,13 @@ with tab1:
                     st.error("❌ Ingresa el nombre del solicitante")
                 else:
                     with st.spinner("Generando SOLPED en Google Sheets..."):
-                        # Cargar historial actual
-                        df_solped = load_solped_from_sheets()
+                        # Reservar numero de SOLPED (atomico, sin leer el historial)
+                        try:
+                            numero_solped = SolpedCounter(get_handler()).next_number(solicitado_por)
+                        except Exception as e:
+                            st.error("❌ No se pudo asignar numero de SOLPED: " + str(e))
+                            st.stop()
                         
-                        # Generar numero de SOLPED
-                        numero_solped = get_next_solped_number(df_solped)
                         fecha_actual = datetime.now().strftime('%Y-%m-%d %H:%M')
                         
                         # Crear filas para cada item
@@ -400,16 +405,10 @@ with tab1:
                                 'Notas': notas_generales
                             })
                         
-                        df_nuevas = pd.DataFrame(nuevas_filas)
-                        
-                        # Agregar al historial
-                        if df_solped.empty:
-                            df_actualizado = df_nuevas
-                        else:
-                            df_actualizado = pd.concat([df_solped, df_nuevas], ignore_index=True)
+                        df_nuevas = pd.DataFrame(nuevas_filas, columns=SOLPED_COLUMNS)
                         
-                        # Guardar en Google Sheets
-                        success = save_solped_to_sheets(df_actualizado)
+                        # Agregar solo las lineas nuevas al historial
+                        success = append_solped_to_sheets(df_nuevas)
                         
                         if success:
                             st.success("✅ SOLPED **" + numero_solped + "** generada exitosamente")
@@ -486,7 +485,7 @@ with tab3:
     st.markdown("### 📈 Resumen de SOLPEDs")
     
     with st.spinner("Calculando resumen..."):
-        df_resumen = load_solped_from_sheets()
+        df_resumen = load_solped_from_sheets(['SOLPED_Numero', 'Valor_Total', 'Estado'])
     
     if df_resumen.empty:
         st.info("No hay datos suficientes para mostrar el resumen.")
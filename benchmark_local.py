@@ -0,0 +1,142 @@
+"""
+Benchmark sin red con el backend local de Sheets
+JAC Engineering SAS
+
+Uso:
+    python benchmark_local.py [materiales] [latencia_ms] [usuarios]
+
+Ejemplo:
+    python benchmark_local.py 20000 150 10
+"""
+
+import os
+import sys
+import time
+import threading
+
+os.environ['JAC_SHEETS_BACKEND'] = 'local'
+if len(sys.argv) > 2:
+    os.environ['JAC_LOCAL_LATENCY_MS'] = sys.argv[2]
+
+import numpy as np
+import pandas as pd
+
+from config.google_config import SHEETS_CONFIG
+from src.google_sheets_handler import get_sheets_handler
+from src.data_loader_sheets import DataLoaderSheets
+from src.inventory_analyzer import InventoryAnalyzer
+from src.solped_counter import SolpedCounter
+from src.cache_registry import get_registry
+from src.inventory_service import get_inventory_analysis
+from src.inventory_schema import memory_report
+
+
+def generar_datos(n):
+    """Inventario SAP y parametros sinteticos con la estructura de las hojas reales"""
+    rng = np.random.default_rng(42)
+    centros = ['1001', '1002', '2001', '3001']
+
+    sap = pd.DataFrame({
+        'Codigo material': np.arange(100000, 100000 + n),
+        'Texto breve de material': ['MATERIAL ELECTRICO ' + str(i) for i in range(n)],
+        'Centro': rng.choice(centros, n),
+        'Nombre centro de costo': 'CAMPO',
+        'Ubicacion': ['EST-' + str(i % 50) for i in range(n)],
+        'Cantidad': rng.integers(0, 100, n),
+        'Unidad de medida': 'UND',
+        'Valor por unidad': rng.integers(1000, 500000, n),
+        'Valor total': 0
+    })
+
+    params = pd.DataFrame({
+        'Codigo': sap['Codigo material'],
+        'Centro': sap['Centro'],
+        'Descripcion': sap['Texto breve de material'],
+        'Nombre_Tecnico': '',
+        'Centro_Nombre': 'CAMPO',
+        'Stock_Minimo': rng.integers(0, 30, n),
+        'Stock_Maximo': rng.integers(30, 90, n),
+        'Lead_Time_dias': 30,
+        'Criticidad': rng.choice(['A', 'B', 'C'], n),
+        'Consumo_Prom_Mensual': 5,
+        'Proveedor': 'POR CONFIGURAR',
+        'Categoria': 'MATERIAL_ELECTRICO',
+        'Observaciones': ''
+    })
+
+    return sap, params
+
+
+def medir(nombre, fn):
+    inicio = time.perf_counter()
+    resultado = fn()
+    print("  " + nombre.ljust(40) + str(round(time.perf_counter() - inicio, 3)) + " s")
+    return resultado
+
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+usuarios = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+print("=" * 70)
+print("  BENCHMARK LOCAL - " + str(n) + " materiales")
+print("=" * 70)
+
+handler = get_sheets_handler()
+sap, params = generar_datos(n)
+
+historial = pd.DataFrame({'SOLPED_Numero': [], 'Fecha': [], 'Codigo': []})
+
+for nombre, df in [('inventario_sap', sap), ('parametros', params), ('solped', historial)]:
+    config = SHEETS_CONFIG[nombre]
+    handler.seed_dataframe(df, config['sheet_id'], config['sheet_name'])
+
+loader = DataLoaderSheets()
+
+merged = medir("merge_data", loader.merge_data)
+analisis = medir("full_analysis", lambda: InventoryAnalyzer(merged).full_analysis())
+
+print()
+print("  Memoria del analisis (sin esquema compacto -> con esquema compacto):")
+sin_compactar = analisis.astype({
+    col: ('float64' if analisis[col].dtype.kind in 'iuf' else object)
+    for col in analisis.columns
+    if isinstance(analisis[col].dtype, pd.CategoricalDtype) or str(analisis[col].dtype) in ('float32', 'int32')
+})
+memory_report(sin_compactar, analisis)
+print()
+
+patch = [{'codigo': str(sap['Codigo material'].iloc[0]), 'centro': str(sap['Centro'].iloc[0]), 'stock_minimo': 7}]
+medir("save_parameter_patches (1 fila)", lambda: loader.save_parameter_patches(patch))
+
+contador = SolpedCounter(handler)
+medir("numero SOLPED", lambda: contador.next_number('benchmark'))
+
+print()
+print("  " + str(usuarios) + " usuarios concurrentes con merge_data...")
+antes = handler.client.request_count
+hilos = [threading.Thread(target=lambda: DataLoaderSheets().merge_data()) for _ in range(usuarios)]
+inicio = time.perf_counter()
+for h in hilos:
+    h.start()
+for h in hilos:
+    h.join()
+print("  Tiempo total: " + str(round(time.perf_counter() - inicio, 3)) + " s")
+print("  Solicitudes a la API: " + str(handler.client.request_count - antes))
+
+print()
+print("  " + str(usuarios) + " usuarios concurrentes con la cache compartida (en frio)...")
+registro = get_registry()
+# Solo en memoria: los datos sinteticos no deben leer ni reemplazar el snapshot de data/processed
+for nombre in registro.names():
+    registro.cache(nombre).persist = False
+registro.invalidate(*registro.names())
+antes = handler.client.request_count
+hilos = [threading.Thread(target=get_inventory_analysis) for _ in range(usuarios)]
+inicio = time.perf_counter()
+for h in hilos:
+    h.start()
+for h in hilos:
+    h.join()
+print("  Tiempo total: " + str(round(time.perf_counter() - inicio, 3)) + " s")
+print("  Solicitudes a la API: " + str(handler.client.request_count - antes))
+print("=" * 70)
@@ -19,4 +19,54 @@ SHEETS_CONFIG = {
     }
 }
 
+# Tipos de columna para las lecturas tipadas (read_sheet_typed):
+# 'codigo' = texto sin .0 (vacio -> NaN), 'numero' = float, 'texto' = texto
+SHEETS_SCHEMAS = {
+    'inventario_sap': {
+        'Codigo material': 'codigo',
+        'Texto breve de material': 'texto',
+        'Centro': 'texto',
+        'Nombre centro de costo': 'texto',
+        'Ubicacion': 'texto',
+        'Cantidad': 'numero',
+        'Unidad de medida': 'texto',
+        'Valor por unidad': 'numero',
+        'Valor total': 'numero'
+    },
+    'parametros': {
+        'Codigo': 'codigo',
+        'Centro': 'texto',
+        'Descripcion': 'texto',
+        'Nombre_Tecnico': 'texto',
+        'Centro_Nombre': 'texto',
+        'Stock_Minimo': 'numero',
+        'Stock_Maximo': 'numero',
+        'Lead_Time_dias': 'numero',
+        'Criticidad': 'texto',
+        'Consumo_Prom_Mensual': 'numero',
+        'Proveedor': 'texto',
+        'Categoria': 'texto',
+        'Observaciones': 'texto'
+    }
+}
+
+# Filas por solicitud al leer JAC_Inventario_SAP por bloques
+SHEETS_CHUNK_ROWS = 5000
+
+# Segundos entre consultas de version (modifiedTime) de las hojas.
+# Los datos solo se vuelven a leer cuando la version cambia.
+VERSION_PROBE_SECONDS = 15
+
+# Cuota de la API de Sheets (por minuto, por cuenta de servicio)
+SHEETS_QUOTA = {
+    'read_requests_per_minute': 60,
+    'write_requests_per_minute': 60,
+    'burst': 10,
+    'max_retries': 5
+}
+
+# Contador de SOLPED: una hoja por anio dentro de la spreadsheet de SOLPED
+# (ej. JAC_SOLPED_Contador_2026). Cada numero se reserva con un append.
+SOLPED_COUNTER_PREFIX = 'JAC_SOLPED_Contador_'
+
 CREDENTIALS_FILE = 'config/google_credentials.json'
\ No newline at end of file
@@ -35,4 +35,10 @@ COMPANY_INFO = {
 
 # Formato de fecha
 DATE_FORMAT = '%Y-%m-%d'
-DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
\ No newline at end of file
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Busqueda de materiales: resultados por pagina en cada pantalla
+SEARCH_PAGE_SIZE = {
+    'tablero': 50,
+    'solped': 10,
+    'configuracion': 200
+}
@@ -0,0 +1,76 @@
+"""
+Registro de caches con nombre
+JAC Engineering SAS
+INVALIDACION SELECTIVA EN LUGAR DE st.cache_data.clear()
+
+Cada dataset (sap, parametros, inventario, analisis, solped) se registra
+con su cache y los datasets de los que depende. invalidate('parametros')
+descarta parametros y lo que se construye a partir de ellos, sin tocar
+el resto: las demas sesiones siguen leyendo de memoria.
+"""
+
+import threading
+
+
+class CacheRegistry:
+
+    def __init__(self):
+        self._caches = {}
+        self._dependents = {}
+        self._lock = threading.Lock()
+    
+    def register(self, name, cache, depends_on=()):
+        """Registra un cache (con get(wait), clear() y mark_stale()) y sus dependencias"""
+        with self._lock:
+            self._caches[name] = cache
+            for dependency in depends_on:
+                self._dependents.setdefault(dependency, set()).add(name)
+    
+    def get(self, name, wait=False):
+        """(df, meta) del dataset, o None si no hay datos"""
+        return self._caches[name].get(wait=wait)
+    
+    def cache(self, name):
+        """El cache registrado con ese nombre"""
+        return self._caches[name]
+    
+    def affected(self, *names):
+        """Los datasets indicados mas todos los que dependen de ellos"""
+        with self._lock:
+            pending = list(names)
+            result = set()
+            while pending:
+                name = pending.pop()
+                if name in result:
+                    continue
+                if name not in self._caches:
+                    raise KeyError("Dataset no registrado: " + name)
+                result.add(name)
+                pending.extend(self._dependents.get(name, ()))
+        return result
+    
+    def invalidate(self, *names, keep_previous=False):
+        """
+        Descarta los datasets indicados y sus dependientes; devuelve los afectados.
+        keep_previous=True: se siguen sirviendo los datos anteriores mientras
+        una sola reconstruccion por dataset trae los nuevos.
+        """
+        afectados = self.affected(*names)
+        for name in afectados:
+            if keep_previous:
+                self._caches[name].mark_stale()
+            else:
+                self._caches[name].clear()
+        print("Cache invalidada: " + ", ".join(sorted(afectados)))
+        return afectados
+    
+    def names(self):
+        with self._lock:
+            return sorted(self._caches)
+
+
+_registry = CacheRegistry()
+
+def get_registry():
+    """Registro unico del proceso (compartido por todas las sesiones)"""
+    return _registry
@@ -6,133 +6,261 @@ VERSION QUE LEE TODO DESDE GOOGLE SHEETS
 
 import pandas as pd
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import threading
+import time
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.google_sheets_handler import GoogleSheetsHandler
-from config.google_config import SHEETS_CONFIG
+from src.google_sheets_handler import get_sheets_handler
+from src.inventory_schema import compact_inventory
+from src.search_index import search_key, CLAVE_BUSQUEDA
+from config.google_config import SHEETS_CONFIG, SHEETS_SCHEMAS, SHEETS_CHUNK_ROWS, VERSION_PROBE_SECONDS
 
-class DataLoaderSheets:
+# Nombres internos -> columnas de la hoja JAC_Inventario_SAP
+SAP_COLUMNAS_SHEET = {
+    'codigo': 'Codigo material',
+    'descripcion': 'Texto breve de material',
+    'centro': 'Centro',
+    'centro_nombre': 'Nombre centro de costo',
+    'ubicacion': 'Ubicacion',
+    'stock_actual': 'Cantidad',
+    'unidad': 'Unidad de medida',
+    'precio_unitario': 'Valor por unidad',
+    'valor_total': 'Valor total'
+}
+
+# Nombres internos -> columnas de la hoja JAC_Parametros_Stock
+PARAMETROS_COLUMNAS_SHEET = {
+    'codigo': 'Codigo',
+    'centro': 'Centro',
+    'descripcion': 'Descripcion',
+    'nombre_tecnico': 'Nombre_Tecnico',
+    'centro_nombre_param': 'Centro_Nombre',
+    'stock_minimo': 'Stock_Minimo',
+    'stock_maximo': 'Stock_Maximo',
+    'lead_time': 'Lead_Time_dias',
+    'criticidad': 'Criticidad',
+    'consumo_mensual': 'Consumo_Prom_Mensual',
+    'proveedor': 'Proveedor',
+    'Categoria': 'Categoria',
+    'observaciones': 'Observaciones'
+}
+
+# Campos que forman la clave de busqueda (CLAVE_BUSQUEDA) de parametros y del
+# inventario combinado; ubicacion y centro se indexan aparte (ver material_search)
+CAMPOS_CLAVE_BUSQUEDA = ['codigo', 'descripcion', 'nombre_tecnico']
+
+# Ultima version conocida de cada spreadsheet: sheet_id -> (version, hora)
+# (compartida por todas las sesiones del proceso)
+_sheet_versions = {}
+_sheet_versions_lock = threading.Lock()
+
+def _cached_version(sheet_id):
+    """Version ya consultada de una spreadsheet, o None si paso VERSION_PROBE_SECONDS"""
+    with _sheet_versions_lock:
+        cached = _sheet_versions.get(sheet_id)
+    
+    if cached is not None and time.monotonic() - cached[1] < VERSION_PROBE_SECONDS:
+        return cached[0]
+    return None
+
+def _probe_version(handler, sheet_id):
+    """Consulta la version de una spreadsheet y la recuerda"""
+    try:
+        valor = handler.get_spreadsheet_version(sheet_id)
+    except Exception as e:
+        print("No se pudo consultar la version de las hojas:", str(e))
+        # Sin version se vuelve al refresco por tiempo (5 minutos)
+        valor = 'sin-version-' + str(int(time.time() // 300))
+    
+    with _sheet_versions_lock:
+        _sheet_versions[sheet_id] = (valor, time.monotonic())
+    
+    return valor
+
+def get_data_version(datasets=('inventario_sap', 'parametros')):
+    """
+    Version de las hojas indicadas (claves de SHEETS_CONFIG), segun el
+    modifiedTime de Drive. Sirve como clave de cache en lugar de un TTL fijo.
+    Cada spreadsheet se consulta a lo sumo cada VERSION_PROBE_SECONDS.
+    """
+    handler = get_sheets_handler()
+    sheet_ids = sorted({SHEETS_CONFIG[n]['sheet_id'] for n in datasets})
+    
+    versiones = {sheet_id: _cached_version(sheet_id) for sheet_id in sheet_ids}
+    pendientes = [sheet_id for sheet_id in sheet_ids if versiones[sheet_id] is None]
     
+    if len(pendientes) > 1:
+        # Spreadsheets distintas: se consultan en paralelo
+        with ThreadPoolExecutor(max_workers=len(pendientes)) as pool:
+            consultadas = pool.map(lambda sheet_id: _probe_version(handler, sheet_id), pendientes)
+            versiones.update(zip(pendientes, consultadas))
+    else:
+        for sheet_id in pendientes:
+            versiones[sheet_id] = _probe_version(handler, sheet_id)
+    
+    return tuple(versiones[sheet_id] for sheet_id in sheet_ids)
+
+def reset_data_version(*datasets):
+    """Olvida la version consultada de esas hojas (o de todas) despues de escribir"""
+    with _sheet_versions_lock:
+        if not datasets:
+            _sheet_versions.clear()
+        for n in datasets:
+            _sheet_versions.pop(SHEETS_CONFIG[n]['sheet_id'], None)
+
+def _sheet_columns(columns, mapping, required):
+    """
+    Traduce una lista de columnas internas a columnas de la hoja
+    (agregando las que el loader necesita). None = todas las columnas.
+    """
+    if columns is None:
+        return None
+    
+    internas = list(required) + [c for c in columns if c not in required]
+    return [mapping.get(c, c) for c in internas]
+
+class DataLoaderSheets:
+
     def __init__(self):
-        self.sheets_handler = GoogleSheetsHandler()
+        self.sheets_handler = get_sheets_handler()
+    
+    def _normalize_sap_chunk(self, df):
+        """Renombra, convierte tipos y limpia un bloque de filas SAP"""
+        # Mapeo de columnas
+        column_mapping = {v: k for k, v in SAP_COLUMNAS_SHEET.items()}
+        
+        df = df.rename(columns=column_mapping)
+        
+        if 'codigo' not in df.columns:
+            raise ValueError("No se encontro columna de codigo")
+        
+        # Limpiar y convertir tipos
+        df['stock_actual'] = pd.to_numeric(df['stock_actual'], errors='coerce').fillna(0)
+        df['precio_unitario'] = pd.to_numeric(df['precio_unitario'], errors='coerce').fillna(0)
+        
+        if 'valor_stock' not in df.columns:
+            df['valor_stock'] = df['stock_actual'] * df['precio_unitario']
+        
+        if 'unidad' not in df.columns:
+            df['unidad'] = 'UND'
+        if 'almacen' not in df.columns:
+            df['almacen'] = 'ALM01'
+        if 'fecha_actualizacion' not in df.columns:
+            df['fecha_actualizacion'] = datetime.now().strftime('%Y-%m-%d')
+        
+        # Limpiar datos (el codigo ya llega como texto sin .0)
+        df = df[df['codigo'].notna()].copy()
+        df['descripcion'] = df['descripcion'].fillna('SIN DESCRIPCION')
+        
+        return df
     
-    def load_sap_data(self):
+    def iter_sap_chunks(self, chunk_rows=SHEETS_CHUNK_ROWS):
+        """
+        Generador: inventario SAP en bloques de chunk_rows filas,
+        cada uno ya normalizado (memoria acotada por el tamano del bloque)
+        """
+        config = SHEETS_CONFIG['inventario_sap']
+        
+        for chunk in self.sheets_handler.iter_sheet_chunks(
+            config['sheet_id'],
+            config['sheet_name'],
+            SHEETS_SCHEMAS['inventario_sap'],
+            chunk_rows
+        ):
+            yield self._normalize_sap_chunk(chunk)
+    
+    def load_sap_data(self, columns=None, raise_errors=False):
         """
         Carga datos SAP desde Google Sheets
         VERSION MULTI-USUARIO
+        columns: lista opcional de columnas internas a descargar
+        raise_errors=True: un error de lectura se propaga (en lugar de un DataFrame vacio)
         """
         try:
             print("Cargando inventario SAP desde Google Sheets...")
             
             config = SHEETS_CONFIG['inventario_sap']
             
-            df = self.sheets_handler.read_sheet_to_dataframe(
-                config['sheet_id'],
-                config['sheet_name']
-            )
+            if columns is None:
+                # Lectura por bloques: cada bloque se normaliza al llegar
+                chunks = list(self.iter_sap_chunks())
+                df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+            else:
+                # Lectura tipada de solo las columnas pedidas
+                df = self.sheets_handler.read_sheet_typed(
+                    config['sheet_id'],
+                    config['sheet_name'],
+                    SHEETS_SCHEMAS['inventario_sap'],
+                    columns=_sheet_columns(
+                        columns,
+                        SAP_COLUMNAS_SHEET,
+                        ['codigo', 'descripcion', 'stock_actual', 'precio_unitario']
+                    ),
+                    raise_errors=raise_errors
+                )
+                if not df.empty:
+                    df = self._normalize_sap_chunk(df)
             
             if df.empty:
                 st.warning("Google Sheet de inventario SAP esta vacia")
                 st.info("Sube tu archivo SAP a Google Sheets")
                 return pd.DataFrame()
             
-            print("Registros leidos: " + str(len(df)))
-            
-            # Mapeo de columnas
-            column_mapping = {
-                'Codigo material': 'codigo',
-                'Texto breve de material': 'descripcion',
-                'Centro': 'centro',
-                'Nombre centro de costo': 'centro_nombre',
-                'Ubicacion': 'ubicacion',
-                'Cantidad': 'stock_actual',
-                'Unidad de medida': 'unidad',
-                'Valor por unidad': 'precio_unitario',
-                'Valor total': 'valor_total'
-            }
-            
-            df.rename(columns=column_mapping, inplace=True)
-            
-            if 'codigo' not in df.columns:
-                st.error("No se encontro columna de codigo")
-                return pd.DataFrame()
-            
-            # Limpiar y convertir tipos
-            df['stock_actual'] = pd.to_numeric(df['stock_actual'], errors='coerce').fillna(0)
-            df['precio_unitario'] = pd.to_numeric(df['precio_unitario'], errors='coerce').fillna(0)
-            
-            if 'valor_stock' not in df.columns:
-                df['valor_stock'] = df['stock_actual'] * df['precio_unitario']
-            
-            if 'unidad' not in df.columns:
-                df['unidad'] = 'UND'
-            if 'almacen' not in df.columns:
-                df['almacen'] = 'ALM01'
-            if 'fecha_actualizacion' not in df.columns:
-                df['fecha_actualizacion'] = datetime.now().strftime('%Y-%m-%d')
-            
-            # Limpiar datos
-            df = df[df['codigo'].notna()].copy()
-            df['descripcion'] = df['descripcion'].fillna('SIN DESCRIPCION')
-            
-            # Convertir codigo a string
-            df['codigo'] = df['codigo'].astype(str)
-            
-            # Remover .0 si es numero entero
-            df['codigo'] = df['codigo'].apply(lambda x: x.replace('.0', '') if '.0' in x else x)
-            
             print("SAP cargado exitosamente: " + str(len(df)) + " registros")
             
             return df
-            
+        
+        except ValueError as e:
+            st.error(str(e))
+            return pd.DataFrame()
+        
         except Exception as e:
+            if raise_errors:
+                raise
             st.error("ERROR cargando inventario SAP: " + str(e))
             import traceback
             st.code(traceback.format_exc())
             return pd.DataFrame()
     
-    def load_parameters(self):
-        """Carga parametros desde Google Sheets"""
+    def load_parameters(self, columns=None, raise_errors=False):
+        """
+        Carga parametros desde Google Sheets
+        columns: lista opcional de columnas internas a descargar
+        raise_errors=True: un error de lectura se propaga (en lugar de un DataFrame vacio)
+        """
         try:
             config = SHEETS_CONFIG['parametros']
             
-            df = self.sheets_handler.read_sheet_to_dataframe(
+            df = self.sheets_handler.read_sheet_typed(
                 config['sheet_id'],
-                config['sheet_name']
+                config['sheet_name'],
+                SHEETS_SCHEMAS['parametros'],
+                columns=_sheet_columns(
+                    columns,
+                    PARAMETROS_COLUMNAS_SHEET,
+                    ['codigo', 'centro']
+                ),
+                raise_errors=raise_errors
             )
             
             if df.empty:
                 st.warning("Google Sheet de parametros esta vacia")
                 return pd.DataFrame()
             
+            # Codigo y Centro ya llegan como texto
             if 'Codigo' in df.columns:
                 df = df[df['Codigo'].notna()].copy()
-                df['Codigo'] = df['Codigo'].astype(str)
-                df['Codigo'] = df['Codigo'].apply(lambda x: x.replace('.0', '') if '.0' in x else x)
             
             if 'Centro' in df.columns:
                 df = df[df['Centro'].notna()].copy()
-                df['Centro'] = df['Centro'].astype(str)
             
-            column_mapping = {
-                'Codigo': 'codigo',
-                'Centro': 'centro',
-                'Descripcion': 'descripcion',
-                'Nombre_Tecnico': 'nombre_tecnico',
-                'Centro_Nombre': 'centro_nombre_param',
-                'Stock_Minimo': 'stock_minimo',
-                'Stock_Maximo': 'stock_maximo',
-                'Lead_Time_dias': 'lead_time',
-                'Criticidad': 'criticidad',
-                'Consumo_Prom_Mensual': 'consumo_mensual',
-                'Proveedor': 'proveedor',
-                'Categoria': 'Categoria',
-                'Observaciones': 'observaciones'
-            }
+            column_mapping = {v: k for k, v in PARAMETROS_COLUMNAS_SHEET.items()}
             
             df.rename(columns=column_mapping, inplace=True)
             
@@ -157,9 +285,14 @@ class DataLoaderSheets:
             if 'criticidad' in df.columns:
                 df['criticidad'] = df['criticidad'].fillna('B')
             
-            return df
+            if columns is None:
+                df[CLAVE_BUSQUEDA] = search_key(df, CAMPOS_CLAVE_BUSQUEDA)
             
+            return df
+        
         except Exception as e:
+            if raise_errors:
+                raise
             st.error("ERROR cargando parametros: " + str(e))
             return pd.DataFrame()
     
@@ -168,44 +301,90 @@ class DataLoaderSheets:
         try:
             config = SHEETS_CONFIG['parametros']
             
-            column_mapping_reverse = {
-                'codigo': 'Codigo',
-                'centro': 'Centro',
-                'descripcion': 'Descripcion',
-                'nombre_tecnico': 'Nombre_Tecnico',
-                'centro_nombre_param': 'Centro_Nombre',
-                'stock_minimo': 'Stock_Minimo',
-                'stock_maximo': 'Stock_Maximo',
-                'lead_time': 'Lead_Time_dias',
-                'criticidad': 'Criticidad',
-                'consumo_mensual': 'Consumo_Prom_Mensual',
-                'proveedor': 'Proveedor',
-                'Categoria': 'Categoria',
-                'observaciones': 'Observaciones'
-            }
+            # La clave de busqueda se calcula al cargar; no es columna de la hoja
+            df_save = df.drop(columns=[CLAVE_BUSQUEDA], errors='ignore')
+            df_save.rename(columns=PARAMETROS_COLUMNAS_SHEET, inplace=True)
             
-            df_save = df.copy()
-            df_save.rename(columns=column_mapping_reverse, inplace=True)
-            
-            return self.sheets_handler.write_dataframe_to_sheet(
+            success = self.sheets_handler.write_dataframe_to_sheet(
                 df_save,
                 config['sheet_id'],
-                config['sheet_name']
+                config['sheet_name'],
+                mode='diff'
             )
             
+            if success:
+                reset_data_version('parametros')
+            
+            return success
+        
         except Exception as e:
             st.error("ERROR guardando parametros: " + str(e))
             return False
     
-    def merge_data(self):
-        """Combina datos SAP con parametros - TODO DESDE GOOGLE SHEETS"""
+    def save_parameter_patches(self, patches):
+        """
+        Guarda solo las filas editadas, identificadas por (codigo, centro)
+        patches: lista de dicts con codigo, centro y los campos a cambiar
+        """
+        try:
+            config = SHEETS_CONFIG['parametros']
+            
+            df_patches = pd.DataFrame(patches)
+            df_patches['codigo'] = df_patches['codigo'].astype(str)
+            df_patches['centro'] = df_patches['centro'].astype(str)
+            df_patches.rename(columns=PARAMETROS_COLUMNAS_SHEET, inplace=True)
+            
+            success = self.sheets_handler.upsert_rows_by_key(
+                df_patches,
+                config['sheet_id'],
+                config['sheet_name'],
+                ['Codigo', 'Centro']
+            )
+            
+            if success:
+                reset_data_version('parametros')
+            
+            return success
+        
+        except Exception as e:
+            st.error("ERROR guardando parametros: " + str(e))
+            return False
+    
+    def _load_sources_concurrently(self):
+        """Lee inventario SAP y parametros en paralelo (son hojas independientes)"""
+        ctx = get_script_run_ctx()
+        
+        def con_contexto(fn):
+            # Los hilos necesitan el contexto de Streamlit para st.warning/st.error
+            def run():
+                if ctx is not None:
+                    add_script_run_ctx(threading.current_thread(), ctx)
+                return fn()
+            return run
+        
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            sap_future = pool.submit(con_contexto(self.load_sap_data))
+            params_future = pool.submit(con_contexto(self.load_parameters))
+            return sap_future.result(), params_future.result()
+    
+    def merge_data(self, concurrent=True):
+        """
+        Combina datos SAP con parametros - TODO DESDE GOOGLE SHEETS
+        concurrent=True: ambas hojas se leen en paralelo
+        """
         print("\n" + "="*70)
         print("  ACTUALIZANDO INVENTARIO - MODO MULTI-USUARIO")
         print("  Todo desde Google Sheets")
         print("="*70 + "\n")
         
-        print("[1/4] Cargando inventario SAP desde Google Sheets...")
-        sap_data = self.load_sap_data()
+        params = None
+        
+        if concurrent:
+            print("[1-2/4] Cargando inventario SAP y parametros en paralelo...")
+            sap_data, params = self._load_sources_concurrently()
+        else:
+            print("[1/4] Cargando inventario SAP desde Google Sheets...")
+            sap_data = self.load_sap_data()
         
         if sap_data.empty:
             print("ERROR: No hay datos SAP en Google Sheets")
@@ -214,8 +393,19 @@ class DataLoaderSheets:
         print("  SAP cargado: " + str(len(sap_data)) + " registros")
         print()
         
-        print("[2/4] Cargando parametros desde Google Sheets...")
-        params = self.load_parameters()
+        if params is None:
+            print("[2/4] Cargando parametros desde Google Sheets...")
+            params = self.load_parameters()
+        
+        return self.merge_frames(sap_data, params)
+    
+    def merge_frames(self, sap_data, params):
+        """
+        Combina un inventario SAP y unos parametros ya cargados
+        (no modifica los DataFrames recibidos)
+        """
+        sap_data = sap_data.copy()
+        params = params.drop(columns=[CLAVE_BUSQUEDA], errors='ignore')
         
         if params.empty:
             print("  Sin parametros, usando valores por defecto")
@@ -226,7 +416,8 @@ class DataLoaderSheets:
             sap_data['consumo_mensual'] = 0
             sap_data['proveedor'] = 'SIN CONFIGURAR'
             sap_data['nombre_tecnico'] = ''
-            return sap_data
+            sap_data[CLAVE_BUSQUEDA] = search_key(sap_data, CAMPOS_CLAVE_BUSQUEDA)
+            return compact_inventory(sap_data)
         
         print("  Parametros cargados: " + str(len(params)) + " registros")
         print()
@@ -277,10 +468,13 @@ class DataLoaderSheets:
         else:
             merged['nombre_tecnico'] = ''
         
+        # Clave de busqueda con la descripcion y el nombre tecnico ya combinados
+        merged[CLAVE_BUSQUEDA] = search_key(merged, CAMPOS_CLAVE_BUSQUEDA)
+        
         print()
         print("="*70)
         print("  DATOS COMBINADOS: " + str(len(merged)) + " registros")
         print("  Fuente: 100% Google Sheets (multi-usuario)")
         print("="*70 + "\n")
         
-        return merged
\ No newline at end of file
+        return compact_inventory(merged)
\ No newline at end of file
@@ -6,91 +6,354 @@ VERSION COMPATIBLE CON RENDER, STREAMLIT CLOUD Y LOCAL
 
 import gspread
 from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import Request
+from gspread.utils import rowcol_to_a1, a1_to_rowcol
+from gspread.urls import DRIVE_FILES_API_V3_URL
 import pandas as pd
+import numpy as np
 import streamlit as st
+import threading
+import json
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.sheets_scheduler import get_scheduler
+
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+# Cliente compartido por todo el proceso (todas las sesiones de Streamlit)
+_shared_client = None
+_shared_credentials = None
+_shared_handler = None
+_client_lock = threading.Lock()
+
+
+def _build_credentials(scopes):
+    """Construye credenciales - Compatible con Render, Streamlit Cloud y Local"""
+    # OPCION 1: Variables de entorno (Render/Heroku) - VERIFICAR PRIMERO
+    if os.environ.get('GCP_PROJECT_ID'):
+        print("Autenticando con variables de entorno (Render/Heroku)...")
+        
+        # Construir diccionario de credenciales desde env vars
+        private_key = os.environ.get('GCP_PRIVATE_KEY', '')
+        
+        # Render/Heroku pueden escapar los saltos de linea, restaurarlos
+        if '\\n' in private_key:
+            private_key = private_key.replace('\\n', '\n')
+        
+        credentials_dict = {
+            'type': os.environ.get('GCP_TYPE', 'service_account'),
+            'project_id': os.environ.get('GCP_PROJECT_ID'),
+            'private_key_id': os.environ.get('GCP_PRIVATE_KEY_ID'),
+            'private_key': private_key,
+            'client_email': os.environ.get('GCP_CLIENT_EMAIL'),
+            'client_id': os.environ.get('GCP_CLIENT_ID'),
+            'auth_uri': os.environ.get('GCP_AUTH_URI', 'https://accounts.google.com/o/oauth2/auth'),
+            'token_uri': os.environ.get('GCP_TOKEN_URI', 'https://oauth2.googleapis.com/token'),
+            'auth_provider_x509_cert_url': os.environ.get('GCP_AUTH_PROVIDER_CERT', 'https://www.googleapis.com/oauth2/v1/certs'),
+            'client_x509_cert_url': os.environ.get('GCP_CLIENT_CERT_URL'),
+            'universe_domain': os.environ.get('GCP_UNIVERSE_DOMAIN', 'googleapis.com')
+        }
+        
+        return Credentials.from_service_account_info(
+            credentials_dict,
+            scopes=scopes
+        )
+    
+    # OPCION 2: Streamlit secrets (Streamlit Cloud)
+    elif hasattr(st, 'secrets'):
+        try:
+            # Intentar acceder a secrets sin lanzar excepcion
+            secrets_dict = st.secrets.to_dict() if hasattr(st.secrets, 'to_dict') else {}
+            
+            if 'gcp_service_account' in secrets_dict:
+                print("Autenticando con Streamlit secrets...")
+                credentials_dict = dict(st.secrets['gcp_service_account'])
+                return Credentials.from_service_account_info(
+                    credentials_dict,
+                    scopes=scopes
+                )
+            else:
+                raise ValueError("No se encontraron credenciales de GCP en Streamlit secrets")
+        except Exception as e:
+            print("No se pudieron leer Streamlit secrets:", str(e))
+            # Intentar con archivo local como fallback
+            raise
+    
+    # OPCION 3: Archivo local (desarrollo)
+    else:
+        print("Autenticando con archivo local...")
+        credentials_file = 'config/google_credentials.json'
+        
+        if not os.path.exists(credentials_file):
+            raise FileNotFoundError(
+                "No se encontro google_credentials.json y no hay variables de entorno configuradas. "
+                "Por favor configura las variables de entorno GCP_* en Render."
+            )
+        
+        return Credentials.from_service_account_file(
+            credentials_file,
+            scopes=scopes
+        )
+
+
+def _scheduled_request(request, method, endpoint, *args, **kwargs):
+    """Pasa una solicitud HTTP por el planificador (cuota, reintentos, lecturas compartidas)"""
+    kind = 'read' if method.lower() == 'get' else 'write'
+    
+    key = None
+    if kind == 'read':
+        params = kwargs.get('params') or (args[0] if args else None)
+        key = (endpoint, json.dumps(params, sort_keys=True, default=str))
+    
+    return get_scheduler().run(
+        kind,
+        lambda: request(method, endpoint, *args, **kwargs),
+        key=key
+    )
+
+
+if hasattr(gspread, 'HTTPClient'):
+    # gspread >= 6: todas las solicitudes pasan por HTTPClient.request
+    class _ScheduledHTTPClient(gspread.HTTPClient):
+        def request(self, method, endpoint, *args, **kwargs):
+            return _scheduled_request(super().request, method, endpoint, *args, **kwargs)
+    
+    def _authorize(credentials):
+        return gspread.authorize(credentials, http_client=_ScheduledHTTPClient)
+else:
+    # gspread 5.x: todas las solicitudes pasan por Client.request
+    class _ScheduledClient(gspread.Client):
+        def request(self, method, endpoint, *args, **kwargs):
+            return _scheduled_request(super().request, method, endpoint, *args, **kwargs)
+    
+    def _authorize(credentials):
+        return gspread.authorize(credentials, client_factory=_ScheduledClient)
+
+
+def get_shared_client():
+    """
+    Cliente gspread autenticado una sola vez por proceso.
+    El token se renueva automaticamente: la sesion de gspread lo refresca
+    al expirar y aqui se refresca de forma preventiva bajo el lock.
+    """
+    global _shared_client, _shared_credentials
+    
+    with _client_lock:
+        if _shared_client is None:
+            credentials = _build_credentials(SCOPES)
+            _shared_client = _authorize(credentials)
+            _shared_credentials = credentials
+            print("✅ Autenticacion exitosa con Google Sheets")
+        elif not _shared_credentials.valid:
+            print("Renovando token de Google Sheets...")
+            _shared_credentials.refresh(Request())
+        
+        return _shared_client
+
+
+def get_sheets_handler():
+    """Handler compartido por todos los loaders y paginas del proceso"""
+    global _shared_handler
+    
+    if _shared_handler is None:
+        if os.environ.get('JAC_SHEETS_BACKEND', '').lower() == 'local':
+            # Backend local (memoria/SQLite) para pruebas y benchmarks sin red
+            from src.local_sheets_backend import LocalSheetsHandler
+            handler = LocalSheetsHandler()
+        else:
+            handler = GoogleSheetsHandler()
+        with _client_lock:
+            if _shared_handler is None:
+                _shared_handler = handler
+    
+    return _shared_handler
+
+
+def _is_missing_worksheet_error(error):
+    """True si el error indica que la hoja ya no existe (borrada o renombrada)"""
+    if isinstance(error, gspread.exceptions.WorksheetNotFound):
+        return True
+    return 'Unable to parse range' in str(error)
+
+
+def _is_missing(value):
+    """True para None/NaN/NA"""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return True
+    return isinstance(value, float) and np.isnan(value)
+
+
+def _cell_text(value):
+    """Texto con el que Google Sheets muestra un valor (para comparar celdas)"""
+    if _is_missing(value):
+        return ''
+    if isinstance(value, (bool, np.bool_)):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+_cell_text_array = np.frompyfunc(_cell_text, 1, 1)
+
+
+def _clean_cell(value):
+    """Valor listo para enviar a la API (NaN no es JSON valido)"""
+    if _is_missing(value):
+        return ''
+    return value
+
+
+def _normalize_key(value):
+    """Normaliza un valor de clave (Codigo/Centro) como texto comparable"""
+    texto = _cell_text(value).strip()
+    if texto.endswith('.0') and texto[:-2].isdigit():
+        texto = texto[:-2]
+    return texto
+
+
+def _normalize_key_series(series):
+    """Version vectorizada de _normalize_key"""
+    texto = series.astype(object).where(series.notna(), '').astype(str).str.strip()
+    return texto.str.replace(r'^(\d+)\.0$', r'\1', regex=True)
+
+
+def _key_index(df, key_columns):
+    """Indice (simple o compuesto) con las claves normalizadas de df"""
+    keys = [_normalize_key_series(df[c]) for c in key_columns]
+    if len(keys) == 1:
+        return pd.Index(keys[0])
+    return pd.MultiIndex.from_arrays(keys)
+
+
+def _common_dtype(a, b):
+    """Tipo que puede guardar valores de a y de b (object si no hay uno numpy)"""
+    try:
+        return np.result_type(a, b)
+    except TypeError:
+        return np.dtype(object)
+
+
+def upsert_dataframe(current_df, df, key_column):
+    """
+    Reemplaza en current_df las filas cuya clave aparece en df y agrega las nuevas.
+    key_column puede ser una columna o una lista (clave compuesta).
+    Si df repite una clave, gana la ultima fila.
+    """
+    key_columns = [key_column] if isinstance(key_column, str) else list(key_column)
+    
+    incoming = df[~_key_index(df, key_columns).duplicated(keep='last')]
+    incoming_keys = _key_index(incoming, key_columns)
+    current_keys = _key_index(current_df, key_columns)
+    
+    columns = current_df.columns.tolist() + [c for c in incoming.columns if c not in current_df.columns]
+    result = current_df.reindex(columns=columns)
+    
+    # Posicion en incoming de cada fila actual (-1 si no se actualiza)
+    positions = incoming_keys.get_indexer(current_keys)
+    matched = positions >= 0
+    
+    if matched.any():
+        rows = np.flatnonzero(matched)
+        replacement = incoming.reindex(columns=columns).iloc[positions[matched]]
+        
+        # Columna por columna: solo se amplia el tipo de las que no pueden
+        # guardar los valores nuevos (int + float -> float, numero + texto -> object)
+        for j, column in enumerate(columns):
+            values = replacement[column]
+            dtype = _common_dtype(result[column].dtype, values.dtype)
+            if result[column].dtype != dtype:
+                result[column] = result[column].astype(dtype)
+            result.iloc[rows, j] = values.astype(dtype).values
+    
+    nuevas = incoming[~incoming_keys.isin(current_keys)]
+    if not nuevas.empty:
+        result = pd.concat([result, nuevas.reindex(columns=columns)], ignore_index=True)
+    
+    return result
+
+
+def _decode_column(values, kind):
+    """
+    Convierte una columna de valores crudos (UNFORMATTED_VALUE) al tipo declarado
+    kind: 'numero' (float64, NaN si vacio), 'codigo' (texto sin .0, NaN si vacio),
+          'texto' ('' si vacio) o None (valor crudo)
+    """
+    if kind == 'numero':
+        series = pd.Series(values, dtype=object)
+        series = series.where(values != '')
+        return pd.to_numeric(series, errors='coerce').astype('float64')
+    
+    if kind == 'codigo':
+        texto = pd.Series(_cell_text_array(values), dtype=object).str.strip()
+        texto = texto.str.replace(r'^(\d+)\.0$', r'\1', regex=True)
+        return texto.where(texto != '')
+    
+    if kind == 'texto':
+        return pd.Series(_cell_text_array(values), dtype=object)
+    
+    return pd.Series(values, dtype=object)
+
+
+def _column_letter(col_index):
+    """Letra A1 de la columna (indice base 0)"""
+    return rowcol_to_a1(1, col_index + 1)[:-1]
+
+
+def _contiguous_runs(positions):
+    """Agrupa posiciones ordenadas en bloques contiguos [(inicio, fin), ...]"""
+    runs = []
+    for p in positions:
+        if runs and p == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], p)
+        else:
+            runs.append((p, p))
+    return runs
+
+
+def _padded_grid(rows, n_rows, n_cols):
+    """Matriz object de n_rows x n_cols rellenada con ''"""
+    grid = np.full((n_rows, n_cols), '', dtype=object)
+    for i, row in enumerate(rows):
+        grid[i, :len(row)] = row
+    return grid
+
 
 class GoogleSheetsHandler:
     
     def __init__(self):
-        self.scopes = [
-            'https://www.googleapis.com/auth/spreadsheets',
-            'https://www.googleapis.com/auth/drive'
-        ]
+        self.scopes = SCOPES
         self.client = None
+        
+        # Cache de handles: spreadsheet por sheet_id y worksheet por (sheet_id, sheet_name)
+        self._spreadsheets = {}
+        self._worksheets = {}
+        self._handles_lock = threading.Lock()
+        
+        # Ultimo estado conocido de las hojas escritas con mode='diff', con la
+        # version de la spreadsheet en que se tomo: (df, version)
+        # (las demas no guardan copia: solo se leen)
+        self._last_state = {}
+        
+        # Indice de filas por clave: (sheet_id, sheet_name, key_columns) -> {header, rows}
+        self._row_indexes = {}
+        self._row_indexes_lock = threading.Lock()
+        
+        # Encabezados conocidos por (sheet_id, sheet_name)
+        self._headers = {}
+        
         self._authenticate()
     
     def _authenticate(self):
-        """Autentica con Google Sheets - Compatible con Render, Streamlit Cloud y Local"""
+        """Obtiene el cliente compartido del proceso (autentica solo la primera vez)"""
         try:
-            # OPCION 1: Variables de entorno (Render/Heroku) - VERIFICAR PRIMERO
-            if os.environ.get('GCP_PROJECT_ID'):
-                print("Autenticando con variables de entorno (Render/Heroku)...")
-                
-                # Construir diccionario de credenciales desde env vars
-                private_key = os.environ.get('GCP_PRIVATE_KEY', '')
-                
-                # Render/Heroku pueden escapar los saltos de linea, restaurarlos
-                if '\\n' in private_key:
-                    private_key = private_key.replace('\\n', '\n')
-                
-                credentials_dict = {
-                    'type': os.environ.get('GCP_TYPE', 'service_account'),
-                    'project_id': os.environ.get('GCP_PROJECT_ID'),
-                    'private_key_id': os.environ.get('GCP_PRIVATE_KEY_ID'),
-                    'private_key': private_key,
-                    'client_email': os.environ.get('GCP_CLIENT_EMAIL'),
-                    'client_id': os.environ.get('GCP_CLIENT_ID'),
-                    'auth_uri': os.environ.get('GCP_AUTH_URI', 'https://accounts.google.com/o/oauth2/auth'),
-                    'token_uri': os.environ.get('GCP_TOKEN_URI', 'https://oauth2.googleapis.com/token'),
-                    'auth_provider_x509_cert_url': os.environ.get('GCP_AUTH_PROVIDER_CERT', 'https://www.googleapis.com/oauth2/v1/certs'),
-                    'client_x509_cert_url': os.environ.get('GCP_CLIENT_CERT_URL'),
-                    'universe_domain': os.environ.get('GCP_UNIVERSE_DOMAIN', 'googleapis.com')
-                }
-                
-                credentials = Credentials.from_service_account_info(
-                    credentials_dict,
-                    scopes=self.scopes
-                )
-            
-            # OPCION 2: Streamlit secrets (Streamlit Cloud)
-            elif hasattr(st, 'secrets'):
-                try:
-                    # Intentar acceder a secrets sin lanzar excepcion
-                    secrets_dict = st.secrets.to_dict() if hasattr(st.secrets, 'to_dict') else {}
-                    
-                    if 'gcp_service_account' in secrets_dict:
-                        print("Autenticando con Streamlit secrets...")
-                        credentials_dict = dict(st.secrets['gcp_service_account'])
-                        credentials = Credentials.from_service_account_info(
-                            credentials_dict,
-                            scopes=self.scopes
-                        )
-                    else:
-                        raise ValueError("No se encontraron credenciales de GCP en Streamlit secrets")
-                except Exception as e:
-                    print("No se pudieron leer Streamlit secrets:", str(e))
-                    # Intentar con archivo local como fallback
-                    raise
-            
-            # OPCION 3: Archivo local (desarrollo)
-            else:
-                print("Autenticando con archivo local...")
-                credentials_file = 'config/google_credentials.json'
-                
-                if not os.path.exists(credentials_file):
-                    raise FileNotFoundError(
-                        "No se encontro google_credentials.json y no hay variables de entorno configuradas. "
-                        "Por favor configura las variables de entorno GCP_* en Render."
-                    )
-                
-                credentials = Credentials.from_service_account_file(
-                    credentials_file,
-                    scopes=self.scopes
-                )
-            
-            self.client = gspread.authorize(credentials)
-            print("✅ Autenticacion exitosa con Google Sheets")
+            self.client = get_shared_client()
             
         except Exception as e:
             error_msg = "Error de autenticacion con Google Sheets: " + str(e)
@@ -99,36 +362,278 @@ class GoogleSheetsHandler:
             st.info("Verifica que las variables de entorno GCP_* esten configuradas correctamente en Render")
             raise
     
-    def read_sheet_to_dataframe(self, sheet_id, sheet_name):
-        """Lee Google Sheet y convierte a DataFrame"""
-        try:
+    def _get_worksheet(self, sheet_id, sheet_name):
+        """Devuelve el worksheet desde cache; solo consulta metadatos la primera vez"""
+        key = (sheet_id, sheet_name)
+        
+        with self._handles_lock:
+            worksheet = self._worksheets.get(key)
+            spreadsheet = self._spreadsheets.get(sheet_id)
+        
+        if worksheet is not None:
+            return worksheet
+        
+        # Fuera del lock: hojas distintas se abren en paralelo
+        if spreadsheet is None:
             spreadsheet = self.client.open_by_key(sheet_id)
-            worksheet = spreadsheet.worksheet(sheet_name)
-            
-            data = worksheet.get_all_records()
+        worksheet = spreadsheet.worksheet(sheet_name)
+        
+        with self._handles_lock:
+            self._spreadsheets.setdefault(sheet_id, spreadsheet)
+            return self._worksheets.setdefault(key, worksheet)
+    
+    def invalidate_worksheet(self, sheet_id, sheet_name=None):
+        """Elimina handles de la cache (toda la spreadsheet si no se indica hoja)"""
+        with self._handles_lock:
+            if sheet_name is None:
+                self._spreadsheets.pop(sheet_id, None)
+                for key in [k for k in self._worksheets if k[0] == sheet_id]:
+                    del self._worksheets[key]
+            else:
+                self._spreadsheets.pop(sheet_id, None)
+                self._worksheets.pop((sheet_id, sheet_name), None)
+    
+    def _run_on_worksheet(self, sheet_id, sheet_name, operation):
+        """
+        Ejecuta operation(worksheet) con el handle en cache.
+        Si la hoja fue borrada o renombrada, invalida el handle y reintenta una vez.
+        """
+        try:
+            return operation(self._get_worksheet(sheet_id, sheet_name))
+        except (gspread.exceptions.WorksheetNotFound, gspread.exceptions.APIError) as e:
+            if not _is_missing_worksheet_error(e):
+                raise
+            print("Hoja no encontrada en cache, recargando: " + sheet_name)
+            self.invalidate_worksheet(sheet_id, sheet_name)
+            return operation(self._get_worksheet(sheet_id, sheet_name))
+    
+    def get_spreadsheet_version(self, sheet_id):
+        """
+        Version de la spreadsheet (modifiedTime de Drive).
+        Una solicitud pequena: sirve para saber si hay que volver a leer.
+        """
+        http = getattr(self.client, 'http_client', self.client)
+        response = http.request(
+            'get',
+            DRIVE_FILES_API_V3_URL + '/' + sheet_id,
+            params={'fields': 'modifiedTime', 'supportsAllDrives': True}
+        )
+        return response.json().get('modifiedTime', '')
+    
+    def read_sheet_to_dataframe(self, sheet_id, sheet_name, columns=None, raise_errors=False):
+        """
+        Lee Google Sheet y convierte a DataFrame
+        columns: lista opcional de columnas; solo se descargan esas
+        raise_errors=True: un error se propaga en lugar de devolver un DataFrame vacio
+        """
+        if columns is not None:
+            return self.read_sheet_typed(sheet_id, sheet_name, {}, columns=columns, raise_errors=raise_errors)
+        
+        try:
+            version = self._tracked_version((sheet_id, sheet_name))
             
-            if not data:
-                headers = worksheet.row_values(1)
-                return pd.DataFrame(columns=headers)
+            def leer(worksheet):
+                data = worksheet.get_all_records()
+                
+                if not data:
+                    headers = worksheet.row_values(1)
+                    return pd.DataFrame(columns=headers)
+                
+                return pd.DataFrame(data)
             
-            df = pd.DataFrame(data)
+            df = self._run_on_worksheet(sheet_id, sheet_name, leer)
+            self._remember_state((sheet_id, sheet_name), df, version)
+            self._headers[(sheet_id, sheet_name)] = [str(c) for c in df.columns]
             return df
             
         except Exception as e:
+            if raise_errors:
+                raise
             st.error("Error leyendo Google Sheet: " + str(e))
             print("ERROR leyendo sheet:", str(e))
             return pd.DataFrame()
     
-    def write_dataframe_to_sheet(self, df, sheet_id, sheet_name):
-        """Escribe DataFrame a Google Sheets"""
+    def read_sheet_typed(self, sheet_id, sheet_name, schema, columns=None, raise_errors=False):
+        """
+        Lee la hoja como valores crudos y decodifica cada columna segun
+        schema ({columna: 'numero'|'codigo'|'texto'}).
+        Las columnas fuera del schema quedan con el valor crudo.
+        columns: lista opcional de columnas; solo se descargan esas
+        raise_errors=True: un error se propaga en lugar de devolver un DataFrame vacio
+        """
         try:
-            spreadsheet = self.client.open_by_key(sheet_id)
-            worksheet = spreadsheet.worksheet(sheet_name)
+            if columns is not None:
+                return self._read_projected(sheet_id, sheet_name, schema, columns)
+            
+            version = self._tracked_version((sheet_id, sheet_name))
+            
+            def leer(worksheet):
+                return worksheet.get(
+                    value_render_option='UNFORMATTED_VALUE',
+                    date_time_render_option='FORMATTED_STRING'
+                )
+            
+            rows = self._run_on_worksheet(sheet_id, sheet_name, leer)
+            
+            if not rows:
+                return pd.DataFrame()
             
-            worksheet.clear()
+            header = [_cell_text(v) for v in rows[0]]
+            body = rows[1:]
             
-            values = [df.columns.tolist()] + df.values.tolist()
-            worksheet.update('A1', values)
+            if not body:
+                df = pd.DataFrame(columns=header)
+            else:
+                width = max(len(header), max(len(r) for r in body))
+                grid = _padded_grid(body, len(body), width)
+                df = pd.DataFrame({
+                    name: _decode_column(grid[:, j], schema.get(name))
+                    for j, name in enumerate(header)
+                })
+            
+            self._remember_state((sheet_id, sheet_name), df, version)
+            self._headers[(sheet_id, sheet_name)] = header
+            return df
+            
+        except Exception as e:
+            if raise_errors:
+                raise
+            st.error("Error leyendo Google Sheet: " + str(e))
+            print("ERROR leyendo sheet:", str(e))
+            return pd.DataFrame()
+    
+    def _read_projected(self, sheet_id, sheet_name, schema, columns):
+        """
+        Descarga solo las columnas pedidas: se ubican con el encabezado en
+        cache y se piden en un batch_get (un rango por bloque contiguo).
+        No actualiza _last_state: el resultado no es la hoja completa.
+        """
+        key = (sheet_id, sheet_name)
+        
+        for intento in range(2):
+            header = self.get_header(sheet_id, sheet_name)
+            positions = sorted({header.index(c) for c in columns if c in header})
+            
+            if not positions:
+                return pd.DataFrame(columns=[c for c in columns if c in header])
+            
+            runs = _contiguous_runs(positions)
+            ranges = [_column_letter(a) + ':' + _column_letter(b) for a, b in runs]
+            
+            values = self._run_on_worksheet(
+                sheet_id,
+                sheet_name,
+                lambda worksheet: worksheet.batch_get(
+                    ranges,
+                    value_render_option='UNFORMATTED_VALUE',
+                    date_time_render_option='FORMATTED_STRING'
+                )
+            )
+            
+            # Si el encabezado cambio desde que se guardo en cache, se vuelve a leer
+            fetched = []
+            for (a, b), rows in zip(runs, values):
+                first = [_cell_text(v) for v in (rows[0] if rows else [])]
+                fetched += first + [''] * (b - a + 1 - len(first))
+            expected = [header[a + i] for a, b in runs for i in range(b - a + 1)]
+            
+            if fetched == expected or intento == 1:
+                break
+            
+            self._headers.pop(key, None)
+        
+        n_rows = max((len(rows) - 1 for rows in values), default=0)
+        decoded = {}
+        
+        for (a, b), rows in zip(runs, values):
+            grid = _padded_grid(rows[1:], n_rows, b - a + 1)
+            for j in range(b - a + 1):
+                name = header[a + j]
+                if name in columns and name not in decoded:
+                    decoded[name] = _decode_column(grid[:, j], schema.get(name))
+        
+        if n_rows == 0:
+            return pd.DataFrame(columns=[c for c in columns if c in decoded])
+        
+        return pd.DataFrame({c: decoded[c] for c in columns if c in decoded})
+    
+    def iter_sheet_chunks(self, sheet_id, sheet_name, schema, chunk_rows=5000):
+        """
+        Generador: lee la hoja en ventanas de chunk_rows filas y entrega cada
+        una como DataFrame tipado (mismo decode que read_sheet_typed).
+        La memoria maxima depende del tamano de la ventana, no de la hoja.
+        La primera ventana trae tambien la fila 1 (todas las columnas): el
+        encabezado sale de la misma lectura y reemplaza al de cache.
+        La API omite las filas vacias al final de cada rango: una ventana corta
+        no indica el fin de la hoja. Termina con la primera ventana vacia
+        (no con worksheet.row_count: el handle en cache guarda el tamano de
+        la hoja de cuando se abrio).
+        """
+        def leer_ventana(a1_range):
+            return self._run_on_worksheet(
+                sheet_id,
+                sheet_name,
+                lambda worksheet: worksheet.get(
+                    a1_range,
+                    value_render_option='UNFORMATTED_VALUE',
+                    date_time_render_option='FORMATTED_STRING'
+                )
+            )
+        
+        rows = leer_ventana('1:' + str(chunk_rows + 1))
+        header = [_cell_text(v) for v in (rows[0] if rows else [])]
+        if not header:
+            return
+        
+        self._headers[(sheet_id, sheet_name)] = header
+        last_col = _column_letter(len(header) - 1)
+        
+        rows = [row[:len(header)] for row in rows[1:]]
+        start = 2
+        
+        while rows:
+            grid = _padded_grid(rows, len(rows), len(header))
+            yield pd.DataFrame({
+                name: _decode_column(grid[:, j], schema.get(name))
+                for j, name in enumerate(header)
+            })
+            
+            start += chunk_rows
+            rows = leer_ventana('A' + str(start) + ':' + last_col + str(start + chunk_rows - 1))
+    
+    def write_dataframe_to_sheet(self, df, sheet_id, sheet_name, mode='full'):
+        """
+        Escribe DataFrame a Google Sheets
+        mode='full': borra la hoja y sube todo
+        mode='diff': envia solo las celdas que cambiaron en un batch_update
+        """
+        try:
+            if mode == 'diff':
+                self._run_on_worksheet(
+                    sheet_id,
+                    sheet_name,
+                    lambda worksheet: self._write_diff(worksheet, df, (sheet_id, sheet_name))
+                )
+            else:
+                values = [df.columns.tolist()] + df.values.tolist()
+                
+                def escribir(worksheet):
+                    worksheet.clear()
+                    worksheet.update('A1', values)
+                
+                self._run_on_worksheet(sheet_id, sheet_name, escribir)
+            
+            # La version se consulta despues de escribir: si la API la reporta
+            # con retraso, la siguiente escritura simplemente vuelve a leer
+            if mode == 'diff' or (sheet_id, sheet_name) in self._last_state:
+                self._remember_state(
+                    (sheet_id, sheet_name),
+                    df,
+                    self._state_version((sheet_id, sheet_name)),
+                    track=True
+                )
+            self._headers[(sheet_id, sheet_name)] = [str(c) for c in df.columns]
+            self._drop_row_indexes(sheet_id, sheet_name)
             
             return True
             
@@ -137,14 +642,155 @@ class GoogleSheetsHandler:
             print("ERROR escribiendo sheet:", str(e))
             return False
     
-    def append_rows_to_sheet(self, df, sheet_id, sheet_name):
-        """Agrega filas al final"""
+    def _state_version(self, key):
+        """Version de la spreadsheet para guardar con el ultimo estado (None si falla)"""
         try:
-            spreadsheet = self.client.open_by_key(sheet_id)
-            worksheet = spreadsheet.worksheet(sheet_name)
+            return self.get_spreadsheet_version(key[0])
+        except Exception as e:
+            print("No se pudo consultar la version de " + key[1] + ":", str(e))
+            return None
+    
+    def _tracked_version(self, key):
+        """Version previa a una lectura, solo para hojas que se escriben por diferencias"""
+        if key in self._last_state:
+            return self._state_version(key)
+        return None
+    
+    def _remember_state(self, key, df, version, track=False):
+        """
+        Guarda el ultimo estado de una hoja junto con la version de la spreadsheet.
+        Sin track solo se actualizan las hojas que ya se escriben por diferencias;
+        las demas no se copian: _write_diff lee la hoja la primera vez.
+        """
+        if not track and key not in self._last_state:
+            return
+        
+        if version is None:
+            # Sin version no hay forma de saber si sigue vigente
+            self._last_state.pop(key, None)
+        else:
+            self._last_state[key] = (df.copy(), version)
+    
+    def _write_diff(self, worksheet, df, key):
+        """Compara df con el ultimo estado conocido y escribe solo los rangos cambiados"""
+        previous = self._last_state.get(key)
+        
+        if previous is not None and previous[1] == self._state_version(key):
+            old_rows = [previous[0].columns.tolist()] + previous[0].values.tolist()
+        else:
+            # Sin estado previo, o la hoja cambio desde entonces (otro usuario
+            # inserto, borro u ordeno filas): una lectura de los valores crudos,
+            # comparables con df sin el formato regional ("1.234,5")
+            old_rows = worksheet.get(
+                value_render_option='UNFORMATTED_VALUE',
+                date_time_render_option='FORMATTED_STRING'
+            )
+        
+        new_rows = [df.columns.tolist()] + df.values.tolist()
+        
+        n_rows = max(len(old_rows), len(new_rows))
+        n_cols = max(max((len(r) for r in old_rows), default=0), len(new_rows[0]))
+        
+        old_grid = _cell_text_array(_padded_grid(old_rows, n_rows, n_cols))
+        new_raw = _padded_grid(new_rows, n_rows, n_cols)
+        new_grid = _cell_text_array(new_raw)
+        
+        changed = old_grid != new_grid
+        
+        data = []
+        for r in np.flatnonzero(changed.any(axis=1)):
+            cols = np.flatnonzero(changed[r])
+            first, last = int(cols[0]), int(cols[-1])
+            data.append({
+                'range': rowcol_to_a1(r + 1, first + 1) + ':' + rowcol_to_a1(r + 1, last + 1),
+                'values': [[_clean_cell(v) for v in new_raw[r, first:last + 1]]]
+            })
+        
+        if not data:
+            print("Sin cambios para escribir en " + key[1])
+            return
+        
+        # La hoja debe tener espacio para las filas/columnas nuevas
+        worksheet = self._ensure_grid(worksheet, key, len(new_rows), n_cols)
+        
+        worksheet.batch_update(data)
+        print("Escritura diferencial: " + str(len(data)) + " rangos en " + key[1])
+    
+    def _ensure_grid(self, worksheet, key, n_rows, n_cols):
+        """
+        Agrega filas/columnas si la hoja tiene menos de n_rows x n_cols.
+        Antes de cambiar el tamano se vuelve a abrir el handle: row_count y
+        col_count del handle en cache son los de cuando se abrio, y resize
+        (add_rows/add_cols) fija un tamano absoluto que podria achicar una
+        hoja que crecio y borrar filas de otros usuarios.
+        Devuelve el handle con el que seguir escribiendo.
+        """
+        if n_rows <= worksheet.row_count and n_cols <= worksheet.col_count:
+            return worksheet
+        
+        with self._handles_lock:
+            self._worksheets.pop(key, None)
+        worksheet = self._get_worksheet(*key)
+        
+        if n_rows > worksheet.row_count:
+            worksheet.add_rows(n_rows - worksheet.row_count)
+        if n_cols > worksheet.col_count:
+            worksheet.add_cols(n_cols - worksheet.col_count)
+        
+        return worksheet
+    
+    def get_header(self, sheet_id, sheet_name, refresh=False):
+        """
+        Encabezado (fila 1) de la hoja, desde cache
+        refresh=True: lo vuelve a leer de la hoja
+        """
+        key = (sheet_id, sheet_name)
+        
+        header = None if refresh else self._headers.get(key)
+        if header is None:
+            header = self._run_on_worksheet(
+                sheet_id,
+                sheet_name,
+                lambda worksheet: worksheet.row_values(1)
+            )
+            self._headers[key] = header
+        
+        return list(header)
+    
+    def append_rows_to_sheet(self, df, sheet_id, sheet_name, match_header=False):
+        """
+        Agrega filas al final
+        match_header=True: valida las columnas contra el encabezado de la hoja
+        y las ordena igual (columnas faltantes quedan vacias)
+        """
+        try:
+            if match_header:
+                # Se lee la fila 1 actual: la hoja pudo cambiar de columnas
+                # desde que se guardo el encabezado en cache
+                header = self.get_header(sheet_id, sheet_name, refresh=True)
+                
+                if not header:
+                    # Hoja vacia: el encabezado va con las filas
+                    values = [df.columns.tolist()] + df.values.tolist()
+                    self._headers[(sheet_id, sheet_name)] = [str(c) for c in df.columns]
+                else:
+                    extra = [c for c in df.columns if c not in header]
+                    if extra:
+                        raise ValueError(
+                            "Columnas que no existen en la hoja " + sheet_name + ": " + ", ".join(extra)
+                        )
+                    values = df.reindex(columns=header, fill_value='').values.tolist()
+            else:
+                values = df.values.tolist()
+            
+            values = [[_clean_cell(v) for v in row] for row in values]
             
-            values = df.values.tolist()
-            worksheet.append_rows(values)
+            self._run_on_worksheet(
+                sheet_id,
+                sheet_name,
+                lambda worksheet: worksheet.append_rows(values)
+            )
+            self._forget_sheet_state(sheet_id, sheet_name)
             
             return True
             
@@ -153,34 +799,292 @@ class GoogleSheetsHandler:
             print("ERROR agregando filas:", str(e))
             return False
     
+    def ensure_worksheet(self, sheet_id, sheet_name, rows=100, cols=10):
+        """
+        Crea la hoja si no existe. Devuelve True si la creo esta llamada.
+        Lanza excepcion si falla.
+        """
+        try:
+            self._get_worksheet(sheet_id, sheet_name)
+            return False
+        except gspread.exceptions.WorksheetNotFound:
+            pass
+        
+        with self._handles_lock:
+            spreadsheet = self._spreadsheets.get(sheet_id)
+            if spreadsheet is None:
+                spreadsheet = self.client.open_by_key(sheet_id)
+                self._spreadsheets[sheet_id] = spreadsheet
+            
+            try:
+                worksheet = spreadsheet.add_worksheet(sheet_name, rows, cols)
+            except Exception as e:
+                # Otro proceso la creo primero
+                if 'already exists' not in str(e):
+                    raise
+                return False
+            
+            self._worksheets[(sheet_id, sheet_name)] = worksheet
+            print("Hoja creada: " + sheet_name)
+            return True
+    
+    def has_worksheet(self, sheet_id, sheet_name):
+        """True si la hoja existe (con el handle en cache no hace solicitudes)"""
+        try:
+            self._get_worksheet(sheet_id, sheet_name)
+            return True
+        except gspread.exceptions.WorksheetNotFound:
+            return False
+    
+    def delete_worksheet(self, sheet_id, sheet_name):
+        """Borra la hoja y olvida su handle y estado. Lanza excepcion si falla."""
+        worksheet = self._get_worksheet(sheet_id, sheet_name)
+        worksheet.spreadsheet.del_worksheet(worksheet)
+        
+        self.invalidate_worksheet(sheet_id, sheet_name)
+        self._forget_sheet_state(sheet_id, sheet_name)
+        self._headers.pop((sheet_id, sheet_name), None)
+        print("Hoja borrada: " + sheet_name)
+    
+    def get_values(self, sheet_id, sheet_name, a1_range):
+        """Valores de un rango A1 (lista de filas). Lanza excepcion si falla."""
+        return self._run_on_worksheet(
+            sheet_id,
+            sheet_name,
+            lambda worksheet: worksheet.get(a1_range)
+        )
+    
+    def update_values(self, sheet_id, sheet_name, a1_range, values):
+        """Escribe valores en un rango A1. Lanza excepcion si falla."""
+        self._run_on_worksheet(
+            sheet_id,
+            sheet_name,
+            lambda worksheet: worksheet.update(range_name=a1_range, values=values)
+        )
+        self._forget_sheet_state(sheet_id, sheet_name)
+    
+    def append_row_get_number(self, sheet_id, sheet_name, values):
+        """
+        Agrega una fila y devuelve el numero de fila donde quedo.
+        La API serializa los append, asi que cada llamada recibe una fila distinta.
+        Lanza excepcion si falla.
+        """
+        response = self._run_on_worksheet(
+            sheet_id,
+            sheet_name,
+            lambda worksheet: worksheet.append_row(
+                [_clean_cell(v) for v in values],
+                insert_data_option='INSERT_ROWS',
+                table_range='A1'
+            )
+        )
+        self._forget_sheet_state(sheet_id, sheet_name)
+        
+        updated_range = response['updates']['updatedRange']
+        first_cell = updated_range.split('!')[-1].split(':')[0]
+        return a1_to_rowcol(first_cell)[0]
+    
+    def _drop_row_indexes(self, sheet_id, sheet_name):
+        """Invalida los indices de filas de una hoja"""
+        with self._row_indexes_lock:
+            for key in [k for k in self._row_indexes if k[0] == sheet_id and k[1] == sheet_name]:
+                self._row_indexes.pop(key, None)
+    
+    def _forget_sheet_state(self, sheet_id, sheet_name):
+        """Olvida estado e indices de una hoja modificada fuera de una escritura completa"""
+        self._last_state.pop((sheet_id, sheet_name), None)
+        self._drop_row_indexes(sheet_id, sheet_name)
+    
+    def _build_row_index(self, worksheet, key_columns):
+        """Lee encabezado y columnas clave; devuelve {header, rows: clave -> [numeros de fila]}"""
+        header = worksheet.row_values(1)
+        
+        missing = [c for c in key_columns if c not in header]
+        if missing:
+            raise ValueError("Columnas clave no encontradas en la hoja: " + ", ".join(missing))
+        
+        letters = [rowcol_to_a1(1, header.index(c) + 1)[:-1] for c in key_columns]
+        columns = worksheet.batch_get([letter + '2:' + letter for letter in letters])
+        
+        n_rows = max(len(col) for col in columns)
+        rows = {}
+        for i in range(n_rows):
+            key = tuple(
+                _normalize_key(col[i][0]) if i < len(col) and col[i] else ''
+                for col in columns
+            )
+            rows.setdefault(key, []).append(i + 2)
+        
+        return {'header': header, 'rows': rows}
+    
+    def _get_row_index(self, worksheet, sheet_id, sheet_name, key_columns, refresh=False):
+        """Devuelve (indice, recien_leido); la lectura se hace fuera del lock"""
+        index_key = (sheet_id, sheet_name, tuple(key_columns))
+        
+        with self._row_indexes_lock:
+            index = self._row_indexes.get(index_key)
+        
+        if index is not None and not refresh:
+            return index, False
+        
+        index = self._build_row_index(worksheet, key_columns)
+        with self._row_indexes_lock:
+            self._row_indexes[index_key] = index
+        
+        return index, True
+    
+    def _rows_still_match(self, worksheet, index, key_columns, targets):
+        """
+        Verifica (una lectura pequena) que el encabezado y las filas del indice
+        siguen iguales: otro usuario pudo mover, agregar o renombrar columnas.
+        """
+        header = index['header']
+        ranges = ['1:1']
+        for key, row_numbers in targets:
+            for row_number in row_numbers:
+                for column in key_columns:
+                    ranges.append(rowcol_to_a1(row_number, header.index(column) + 1))
+        
+        cells = worksheet.batch_get(ranges)
+        
+        current_header = [str(v) for v in cells[0][0]] if cells[0] else []
+        if current_header != [str(c) for c in header]:
+            return False
+        
+        found = [_normalize_key(c[0][0]) if c and c[0] else '' for c in cells[1:]]
+        expected = [
+            part
+            for key, row_numbers in targets
+            for _ in row_numbers
+            for part in key
+        ]
+        return found == expected
+    
+    def upsert_rows_by_key(self, patches, sheet_id, sheet_name, key_columns):
+        """
+        Actualiza solo las celdas indicadas de las filas con esa clave (un batch_update).
+        patches: DataFrame con las columnas clave y las columnas a cambiar
+        (NaN = no tocar). Claves nuevas se agregan al final.
+        """
+        try:
+            key_columns = list(key_columns)
+            
+            def actualizar(worksheet):
+                index, recien_leido = self._get_row_index(worksheet, sheet_id, sheet_name, key_columns)
+                
+                keys = [
+                    tuple(_normalize_key(v) for v in values)
+                    for values in patches[key_columns].values.tolist()
+                ]
+                
+                if not recien_leido:
+                    if any(k not in index['rows'] for k in keys):
+                        # Otro proceso pudo agregar esas claves despues de armar el indice:
+                        # se confirma con la hoja antes de agregarlas (evita duplicados)
+                        print("Claves nuevas, releyendo el indice de filas: " + sheet_name)
+                        index, _ = self._get_row_index(worksheet, sheet_id, sheet_name, key_columns, refresh=True)
+                    else:
+                        targets = [(k, index['rows'][k]) for k in keys]
+                        if not self._rows_still_match(worksheet, index, key_columns, targets):
+                            print("Indice de filas desactualizado, reconstruyendo: " + sheet_name)
+                            index, _ = self._get_row_index(worksheet, sheet_id, sheet_name, key_columns, refresh=True)
+                
+                header = list(index['header'])
+                data = []
+                
+                # Columnas nuevas: se agregan al encabezado en el mismo batch
+                value_columns = [c for c in patches.columns if c not in key_columns]
+                for column in value_columns:
+                    if column not in header:
+                        header.append(column)
+                        data.append({
+                            'range': rowcol_to_a1(1, len(header)),
+                            'values': [[column]]
+                        })
+                
+                worksheet = self._ensure_grid(worksheet, (sheet_id, sheet_name), 0, len(header))
+                
+                nuevas = []
+                for key, record in zip(keys, patches.to_dict('records')):
+                    cells = {
+                        header.index(c): _clean_cell(record[c])
+                        for c in value_columns
+                        if not _is_missing(record[c])
+                    }
+                    
+                    if key not in index['rows']:
+                        row = [''] * len(header)
+                        for column in key_columns:
+                            row[header.index(column)] = record[column]
+                        for position, value in cells.items():
+                            row[position] = value
+                        nuevas.append(row)
+                        continue
+                    
+                    # Un rango por cada tramo contiguo de columnas cambiadas
+                    positions = sorted(cells)
+                    runs = []
+                    for position in positions:
+                        if runs and position == runs[-1][-1] + 1:
+                            runs[-1].append(position)
+                        else:
+                            runs.append([position])
+                    
+                    for row_number in index['rows'][key]:
+                        for run in runs:
+                            data.append({
+                                'range': rowcol_to_a1(row_number, run[0] + 1) + ':' + rowcol_to_a1(row_number, run[-1] + 1),
+                                'values': [[cells[p] for p in run]]
+                            })
+                
+                if data:
+                    worksheet.batch_update(data)
+                    index['header'] = header
+                    self._headers[(sheet_id, sheet_name)] = header
+                if nuevas:
+                    worksheet.append_rows(nuevas)
+                
+                print("Upsert por clave: " + str(len(data)) + " rangos, " + str(len(nuevas)) + " filas nuevas en " + sheet_name)
+                
+                return bool(nuevas)
+            
+            hubo_nuevas = self._run_on_worksheet(sheet_id, sheet_name, actualizar)
+            
+            # El estado completo quedo desactualizado; el indice solo si hubo filas nuevas
+            self._last_state.pop((sheet_id, sheet_name), None)
+            if hubo_nuevas:
+                self._drop_row_indexes(sheet_id, sheet_name)
+            
+            return True
+            
+        except Exception as e:
+            st.error("Error actualizando filas por clave: " + str(e))
+            print("ERROR actualizando filas por clave:", str(e))
+            return False
+    
     def update_rows_by_condition(self, df, sheet_id, sheet_name, key_column):
-        """Actualiza filas basado en una columna clave"""
+        """
+        Actualiza filas basado en una columna clave (o lista de columnas)
+        Upsert en una sola pasada: filas existentes se reemplazan, nuevas se agregan
+        """
         try:
-            # Leer datos actuales
+            # Leer datos actuales (la version antes de leer: un cambio posterior fuerza otra lectura)
+            version = self._state_version((sheet_id, sheet_name))
             current_df = self.read_sheet_to_dataframe(sheet_id, sheet_name)
             
             if current_df.empty:
                 # Si no hay datos, escribir todo
                 return self.write_dataframe_to_sheet(df, sheet_id, sheet_name)
             
-            # Actualizar o agregar filas
-            for idx, row in df.iterrows():
-                key_value = row[key_column]
-                
-                # Buscar si existe
-                mask = current_df[key_column] == key_value
-                
-                if mask.any():
-                    # Actualizar fila existente
-                    current_df.loc[mask] = row
-                else:
-                    # Agregar nueva fila
-                    current_df = pd.concat([current_df, pd.DataFrame([row])], ignore_index=True)
+            merged_df = upsert_dataframe(current_df, df, key_column)
+            
+            # La lectura recien hecha es la base de la comparacion (sin leer otra vez)
+            self._remember_state((sheet_id, sheet_name), current_df, version, track=True)
             
-            # Escribir todo de vuelta
-            return self.write_dataframe_to_sheet(current_df, sheet_id, sheet_name)
+            # Escribir solo lo que cambio
+            return self.write_dataframe_to_sheet(merged_df, sheet_id, sheet_name, mode='diff')
             
         except Exception as e:
             st.error("Error actualizando filas: " + str(e))
             print("ERROR actualizando filas:", str(e))
-            return False
\ No newline at end of file
+            return False
@@ -5,16 +5,33 @@ JAC Engineering SAS
 
 import pandas as pd
 import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.inventory_schema import compact_inventory
+
+# Columnas que full_analysis agrega a los datos de entrada
+COLUMNAS_ANALISIS = [
+    'brecha_minimo', 'brecha_maximo', 'cumplimiento_pct', 'estado',
+    'accion', 'cantidad_comprar', 'valor_compra', 'prioridad_num'
+]
 
 class InventoryAnalyzer:
     
     def __init__(self, data):
         self.data = data
+        self._analysis = None
     
     def calculate_gaps(self):
         """Calcula brechas de inventario"""
         df = self.data.copy()
         
+        # Las cantidades pueden venir en float32 (inventory_schema); se opera en float64
+        for col in ['stock_actual', 'stock_minimo', 'stock_maximo']:
+            df[col] = df[col].astype('float64')
+        
         df['brecha_minimo'] = df['stock_actual'] - df['stock_minimo']
         df['brecha_maximo'] = df['stock_maximo'] - df['stock_actual']
         df['cumplimiento_pct'] = (df['stock_actual'] / df['stock_minimo'] * 100).round(1)
@@ -59,38 +76,111 @@ class InventoryAnalyzer:
             return int(np.ceil(qty))
         return 0
     
+    def classify_status_vectorized(self, df):
+        """Misma regla que classify_status, para todas las filas a la vez"""
+        minimo = pd.to_numeric(df['stock_minimo'], errors='coerce').to_numpy(dtype='float64')
+        actual = pd.to_numeric(df['stock_actual'], errors='coerce').to_numpy(dtype='float64')
+        maximo = pd.to_numeric(df['stock_maximo'], errors='coerce').to_numpy(dtype='float64')
+        brecha = pd.to_numeric(df['brecha_minimo'], errors='coerce').to_numpy(dtype='float64')
+        
+        # El orden de las condiciones es el de los if/elif de classify_status
+        return np.select(
+            [np.isnan(minimo), brecha < 0, brecha < minimo * 0.2, actual > maximo],
+            ['SIN CONFIGURAR', 'CRITICO', 'BAJO', 'SOBREINVENTARIO'],
+            default='OK'
+        ).astype(object)
+    
+    def generate_actions_vectorized(self, df, estado):
+        """Mismos textos que generate_actions, para todas las filas a la vez"""
+        fijas = {
+            'SOBREINVENTARIO': "🔵 REVISAR - Stock excesivo",
+            'OK': "🟢 NORMAL - Monitoreo continuo",
+            'SIN CONFIGURAR': "⚪ CONFIGURAR PARAMETROS"
+        }
+        acciones = np.full(len(estado), "—", dtype=object)
+        for status, texto in fijas.items():
+            acciones[estado == status] = texto
+        
+        unidad = df['unidad'].to_numpy(dtype=object)
+        
+        con_cantidad = [
+            ('CRITICO', "🔴 COMPRAR URGENTE - Faltante: ", np.abs(df['brecha_minimo'].to_numpy(dtype='float64'))),
+            ('BAJO', "🟡 SOLICITAR COMPRA - Recomendado: ", df['brecha_maximo'].to_numpy(dtype='float64'))
+        ]
+        
+        for status, prefijo, cantidades in con_cantidad:
+            filas = np.flatnonzero(estado == status)
+            if not len(filas):
+                continue
+            
+            # '%.0f' da el mismo texto que f"{x:.0f}"; se formatea cada valor distinto una vez
+            valores, posicion = np.unique(cantidades[filas], return_inverse=True)
+            textos = np.array(['%.0f' % v for v in valores], dtype=object)[posicion]
+            unidades = np.array([str(u) for u in unidad[filas]], dtype=object)
+            
+            acciones[filas] = prefijo + textos + " " + unidades
+        
+        return acciones
+    
+    def calculate_purchase_qty_vectorized(self, df, estado):
+        """Misma regla que calculate_purchase_qty, para todas las filas a la vez"""
+        faltante = (
+            pd.to_numeric(df['stock_maximo'], errors='coerce').to_numpy(dtype='float64') -
+            pd.to_numeric(df['stock_actual'], errors='coerce').to_numpy(dtype='float64')
+        )
+        # max(0, faltante) de Python deja 0 cuando faltante es NaN
+        faltante = np.where(faltante > 0, faltante, 0.0)
+        
+        comprar = np.isin(estado, ['CRITICO', 'BAJO'])
+        return np.where(comprar, np.ceil(faltante), 0).astype('int64')
+    
     def full_analysis(self):
-        """Análisis completo de inventario"""
+        """
+        Análisis completo de inventario
+        Se calcula una sola vez por analizador (get_summary_metrics lo reutiliza)
+        """
+        if self._analysis is not None:
+            return self._analysis
+        
         df = self.calculate_gaps()
         
-        df['estado'] = df.apply(self.classify_status, axis=1)
-        df['accion'] = df.apply(self.generate_actions, axis=1)
-        df['cantidad_comprar'] = df.apply(self.calculate_purchase_qty, axis=1)
+        estado = self.classify_status_vectorized(df)
+        df['estado'] = estado
+        df['accion'] = self.generate_actions_vectorized(df, estado)
+        df['cantidad_comprar'] = self.calculate_purchase_qty_vectorized(df, estado)
         df['valor_compra'] = df['cantidad_comprar'] * df['precio_unitario']
         
         priority_map = {'A': 1, 'B': 2, 'C': 3}
-        df['prioridad_num'] = df['criticidad'].map(priority_map).fillna(4)
+        df['prioridad_num'] = df['criticidad'].astype(object).map(priority_map).fillna(4)
         
-        df = df.sort_values(['estado', 'prioridad_num', 'brecha_minimo'])
+        df = df.sort_values(['estado', 'prioridad_num', 'brecha_minimo'], kind='stable')
+        df = compact_inventory(df)
         
+        self._analysis = df
         return df
     
     def get_summary_metrics(self):
         """Métricas resumen del inventario"""
-        df = self.full_analysis()
+        return self.metrics_for(self.full_analysis())
+    
+    def metrics_for(self, df):
+        """Métricas resumen de un DataFrame ya analizado (todo o una parte)"""
+        # Un solo conteo por columna en lugar de un filtro por metrica
+        estados = df['estado'].value_counts()
+        criticidad = df['criticidad'].value_counts()
         
         metrics = {
             'total_materiales': len(df),
-            'criticos': len(df[df['estado'] == 'CRITICO']),
-            'bajo': len(df[df['estado'] == 'BAJO']),
-            'ok': len(df[df['estado'] == 'OK']),
-            'sobreinventario': len(df[df['estado'] == 'SOBREINVENTARIO']),
-            'sin_configurar': len(df[df['estado'] == 'SIN CONFIGURAR']),
+            'criticos': int(estados.get('CRITICO', 0)),
+            'bajo': int(estados.get('BAJO', 0)),
+            'ok': int(estados.get('OK', 0)),
+            'sobreinventario': int(estados.get('SOBREINVENTARIO', 0)),
+            'sin_configurar': int(estados.get('SIN CONFIGURAR', 0)),
             'valor_total_stock': df['valor_stock'].sum(),
             'valor_compras_requeridas': df['valor_compra'].sum(),
-            'materiales_categoria_a': len(df[df['criticidad'] == 'A']),
-            'materiales_categoria_b': len(df[df['criticidad'] == 'B']),
-            'materiales_categoria_c': len(df[df['criticidad'] == 'C'])
+            'materiales_categoria_a': int(criticidad.get('A', 0)),
+            'materiales_categoria_b': int(criticidad.get('B', 0)),
+            'materiales_categoria_c': int(criticidad.get('C', 0))
         }
         
         return metrics
\ No newline at end of file
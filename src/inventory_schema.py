@@ -0,0 +1,109 @@
+"""
+Esquema compacto del inventario combinado
+JAC Engineering SAS
+MENOS MEMORIA POR COPIA EN CACHE
+
+Los textos que se repiten en cada fila pasan a category y los numeros
+se reducen de tipo solo cuando no se pierde ningun valor.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Categoricas ordenadas: valores conocidos (se agregan los que aparezcan).
+# El orden es el alfabetico, el mismo con el que ya se ordenaba el texto
+# (sort_values(['estado', ...]) no cambia de resultado).
+CATEGORIAS_ORDENADAS = {
+    'estado': ['BAJO', 'CRITICO', 'OK', 'SIN CONFIGURAR', 'SOBREINVENTARIO'],
+    'criticidad': ['A', 'B', 'C']
+}
+
+# Categoricas sin orden
+CATEGORIAS = ['centro', 'centro_nombre', 'Categoria', 'unidad', 'proveedor', 'accion']
+
+# Cantidades que caben en float32 (los valores en pesos quedan en float64)
+NUMEROS_FLOAT32 = ['stock_actual', 'stock_minimo', 'stock_maximo', 'lead_time', 'consumo_mensual']
+
+NUMEROS_INT32 = ['cantidad_comprar']
+
+
+def _ordered_categorical(serie, conocidas):
+    observadas = serie.dropna().astype(str).unique().tolist()
+    categorias = sorted(set(conocidas) | set(observadas))
+    valores = serie.astype(str).astype(object).where(serie.notna())
+    return pd.Categorical(valores, categories=categorias, ordered=True)
+
+
+def _downcast_float(serie):
+    if serie.dtype != 'float64':
+        return serie
+    
+    reducida = serie.astype('float32')
+    if np.array_equal(reducida.to_numpy(dtype='float64'), serie.to_numpy(), equal_nan=True):
+        return reducida
+    return serie
+
+
+def _downcast_int(serie):
+    if serie.dtype.kind not in 'iu' or serie.empty:
+        return serie
+    
+    info = np.iinfo('int32')
+    if serie.min() >= info.min and serie.max() <= info.max:
+        return serie.astype('int32')
+    return serie
+
+
+def compact_inventory(df):
+    """
+    Aplica el esquema compacto a las columnas de df que existan
+    (devuelve una copia; se puede llamar otra vez sobre un df ya compacto)
+    """
+    df = df.copy()
+    
+    for col, conocidas in CATEGORIAS_ORDENADAS.items():
+        if col in df.columns:
+            df[col] = _ordered_categorical(df[col], conocidas)
+    
+    for col in CATEGORIAS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            if df[col].dtype.kind not in 'iufb':
+                df[col] = df[col].astype('category')
+    
+    for col in NUMEROS_FLOAT32:
+        if col in df.columns:
+            df[col] = _downcast_float(df[col])
+    
+    for col in NUMEROS_INT32:
+        if col in df.columns:
+            df[col] = _downcast_int(df[col])
+    
+    return df
+
+
+def memory_mb(df):
+    """Memoria de cada columna de df en MB (incluye el texto de las columnas object)"""
+    return df.memory_usage(deep=True, index=False) / (1024 * 1024)
+
+
+def memory_report(before, after):
+    """Imprime la memoria por columna antes y despues de compact_inventory"""
+    antes = memory_mb(before)
+    despues = memory_mb(after)
+    
+    print("  " + "Columna".ljust(22) + "Antes MB".rjust(10) + "Despues MB".rjust(12) + "  Tipo")
+    for col in before.columns:
+        if col not in after.columns:
+            continue
+        print(
+            "  " + str(col).ljust(22) +
+            "{:10.2f}".format(antes[col]) +
+            "{:12.2f}".format(despues[col]) +
+            "  " + str(before[col].dtype) + " -> " + str(after[col].dtype)
+        )
+    
+    total_antes = antes.sum()
+    total_despues = despues.sum()
+    print("  " + "TOTAL".ljust(22) + "{:10.2f}".format(total_antes) + "{:12.2f}".format(total_despues))
+    if total_antes:
+        print("  Reduccion: " + str(round((1 - total_despues / total_antes) * 100, 1)) + "%")
@@ -0,0 +1,308 @@
+"""
+Datasets compartidos por todas las sesiones
+JAC Engineering SAS
+CACHE EN MEMORIA + SNAPSHOT EN DISCO
+
+Datasets registrados (ver cache_registry):
+    sap          inventario SAP normalizado
+    parametros   parametros de stock
+    inventario   merge de sap + parametros
+    analisis     full_analysis del inventario + metricas (snapshot en disco)
+    solped       historial de SOLPEDs
+"""
+
+import numpy as np
+import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data_loader_sheets import DataLoaderSheets, get_data_version, reset_data_version, CAMPOS_CLAVE_BUSQUEDA
+from src.google_sheets_handler import get_sheets_handler
+from src.inventory_analyzer import InventoryAnalyzer, COLUMNAS_ANALISIS
+from src.inventory_schema import compact_inventory
+from src.search_index import search_key, CLAVE_BUSQUEDA
+from src.snapshot_store import SnapshotCache
+from src.cache_registry import get_registry
+from config.google_config import SHEETS_CONFIG
+
+# Dataset -> hoja de SHEETS_CONFIG de la que se lee
+DATASET_SHEETS = {
+    'sap': 'inventario_sap',
+    'parametros': 'parametros',
+    'solped': 'solped'
+}
+
+
+def _frame(name):
+    """
+    DataFrame de la version vigente de un dataset (espera si esta desactualizado).
+    None si esa version no se pudo cargar: lo que se construye a partir de
+    el no se publica con datos viejos o vacios, se reintenta en el proximo get.
+    """
+    cache = get_registry().cache(name)
+    get_registry().get(name, wait=True)
+    
+    value, version = cache.peek()
+    if value is None or version != cache.version_fn():
+        return None
+    return value[0]
+
+
+# Los builders leen con raise_errors=True: una lectura fallida no se
+# confunde con una hoja vacia y SnapshotCache no la publica.
+
+def _build_sap():
+    df = DataLoaderSheets().load_sap_data(raise_errors=True)
+    return (df, {}) if not df.empty else None
+
+
+def _build_parametros():
+    return DataLoaderSheets().load_parameters(raise_errors=True), {}
+
+
+def _frames_concurrently(*names):
+    """_frame de varios datasets en paralelo (hojas independientes: la carga en frio no suma latencias)"""
+    ctx = get_script_run_ctx()
+    
+    def cargar(name):
+        # Los hilos necesitan el contexto de Streamlit para st.warning/st.error
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return _frame(name)
+    
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        return list(pool.map(cargar, names))
+
+
+def _build_inventario():
+    sap, parametros = _frames_concurrently('sap', 'parametros')
+    
+    if sap is None or sap.empty or parametros is None:
+        return None
+    
+    return DataLoaderSheets().merge_frames(sap, parametros), {}
+
+
+def _build_analisis():
+    data = _frame('inventario')
+    
+    if data is None or data.empty:
+        return None
+    
+    analyzer = InventoryAnalyzer(data)
+    return analyzer.full_analysis(), analyzer.get_summary_metrics()
+
+
+def _build_solped():
+    config = SHEETS_CONFIG['solped']
+    df = get_sheets_handler().read_sheet_to_dataframe(
+        config['sheet_id'],
+        config['sheet_name'],
+        raise_errors=True
+    )
+    return df, {}
+
+
+def _version_of(*datasets):
+    return lambda: get_data_version(datasets)
+
+
+_registry = get_registry()
+_registry.register(
+    'sap',
+    SnapshotCache('sap', _build_sap, _version_of('inventario_sap'), persist=False)
+)
+_registry.register(
+    'parametros',
+    SnapshotCache('parametros', _build_parametros, _version_of('parametros'), persist=False)
+)
+_registry.register(
+    'inventario',
+    SnapshotCache('inventario', _build_inventario, get_data_version, persist=False),
+    depends_on=('sap', 'parametros')
+)
+_registry.register(
+    'analisis',
+    SnapshotCache('inventario_analisis', _build_analisis, get_data_version),
+    depends_on=('inventario',)
+)
+_registry.register(
+    'solped',
+    SnapshotCache('solped', _build_solped, _version_of('solped'), persist=False)
+)
+
+
+def get_dataset(name, wait=False):
+    """
+    DataFrame del dataset (vacio si no hay datos).
+    wait=False: puede devolver la version anterior mientras se actualiza.
+    No modificar el resultado: es compartido; usar .copy() para editar.
+    """
+    value = _registry.get(name, wait=wait)
+    return value[0] if value is not None else pd.DataFrame()
+
+
+def get_inventory_analysis():
+    """
+    (analysis, metrics) del inventario, o (None, None) si no hay datos.
+    Sale de memoria o del snapshot en disco; si las hojas cambiaron se
+    actualiza en segundo plano.
+    """
+    value = _registry.get('analisis')
+    
+    if value is None:
+        return None, None
+    
+    return value
+
+
+def invalidate_datasets(*names, keep_previous=False):
+    """
+    Descarta los datasets indicados y los que dependen de ellos
+    (llamar despues de escribir en la hoja correspondiente).
+    keep_previous=True: las demas sesiones siguen viendo los datos anteriores
+    hasta que termine la unica reconstruccion.
+    """
+    reset_data_version(*[DATASET_SHEETS[n] for n in names if n in DATASET_SHEETS])
+    return _registry.invalidate(*names, keep_previous=keep_previous)
+
+
+def _patch_keys(df):
+    return pd.MultiIndex.from_arrays([df['codigo'].astype(str), df['centro'].astype(str)])
+
+
+def _patch_frame(df, patch_df):
+    """
+    Copia de df con los campos de patch_df aplicados a las filas con la misma
+    (codigo, centro). Devuelve (nuevo_df, mascara de filas) o None si alguna
+    clave del parche no existe en df. Los NaN del parche no cambian nada.
+    La clave de busqueda de esas filas se vuelve a armar (ej. nombre tecnico nuevo).
+    """
+    keys = _patch_keys(df)
+    patch_keys = _patch_keys(patch_df)
+    
+    if not patch_keys.isin(keys).all():
+        return None
+    
+    mask = keys.isin(patch_keys)
+    positions = patch_keys.get_indexer(keys[mask])
+    rows = np.flatnonzero(mask)
+    
+    df = df.copy()
+    for col in patch_df.columns:
+        if col in ('codigo', 'centro'):
+            continue
+        if col not in df.columns:
+            df[col] = np.nan
+        
+        nuevos = patch_df[col].to_numpy(dtype=object)[positions]
+        actuales = df[col].to_numpy(dtype=object)[rows]
+        valores = np.where(pd.isna(nuevos), actuales, nuevos)
+        
+        if df[col].dtype.kind in 'iuf':
+            valores = pd.to_numeric(pd.Series(valores), errors='coerce').to_numpy(dtype='float64')
+            if df[col].dtype.kind == 'f' and df[col].dtype != 'float64':
+                # float32 de inventory_schema; compact_inventory lo vuelve a reducir
+                df[col] = df[col].astype('float64')
+            elif df[col].dtype.kind != 'f':
+                if np.all(valores == np.round(valores)):
+                    valores = valores.astype(df[col].dtype)
+                else:
+                    df[col] = df[col].astype('float64')
+        else:
+            df[col] = df[col].astype(object)
+        df.iloc[rows, df.columns.get_loc(col)] = valores
+    
+    if CLAVE_BUSQUEDA in df.columns:
+        claves = search_key(df.iloc[rows], CAMPOS_CLAVE_BUSQUEDA).to_numpy(dtype=object)
+        df[CLAVE_BUSQUEDA] = df[CLAVE_BUSQUEDA].astype(object)
+        df.iloc[rows, df.columns.get_loc(CLAVE_BUSQUEDA)] = claves
+    
+    return df, mask
+
+
+def patch_analysis(analysis, metrics, patch_df):
+    """
+    Aplica patch_df a un full_analysis ya calculado: reclasifica solo las
+    filas afectadas y corrige las metricas por diferencia.
+    Devuelve (analysis, metrics) o None si alguna clave no esta en el analisis.
+    """
+    patched = _patch_frame(analysis, patch_df)
+    if patched is None:
+        return None
+    analysis_patched, mask = patched
+    
+    # Reclasificar solo las filas afectadas
+    base = analysis_patched.loc[mask].drop(columns=COLUMNAS_ANALISIS)
+    analyzer = InventoryAnalyzer(base)
+    nuevas = analyzer.full_analysis()
+    viejas = analysis.loc[mask]
+    
+    # Volver al orden de origen antes de ordenar: con un orden estable los
+    # empates quedan igual que en una reconstruccion completa
+    resultado = pd.concat([analysis_patched.loc[~mask], nuevas]).sort_index()
+    resultado = compact_inventory(resultado.sort_values(['estado', 'prioridad_num', 'brecha_minimo'], kind='stable'))
+    
+    antes = analyzer.metrics_for(viejas)
+    despues = analyzer.metrics_for(nuevas)
+    metrics = {k: metrics[k] - antes.get(k, 0) + despues.get(k, 0) for k in metrics}
+    
+    return resultado, metrics
+
+
+def apply_parameter_patches(patches):
+    """
+    Aplica una edicion de parametros ya guardada en Sheets a los datasets en
+    memoria, sin volver a leer las hojas: se parchean parametros e inventario,
+    se reclasifican solo las filas (codigo, centro) afectadas y las metricas
+    se corrigen por diferencia.
+    Devuelve False si no se pudo (ej. material nuevo); entonces hay que
+    invalidar 'parametros'.
+    """
+    try:
+        analisis_cache = _registry.cache('analisis')
+        value, _ = analisis_cache.peek()
+        
+        if value is None:
+            return False
+        
+        analysis, metrics = value
+        
+        patch_df = pd.DataFrame(patches)
+        patch_df['codigo'] = patch_df['codigo'].astype(str)
+        patch_df['centro'] = patch_df['centro'].astype(str)
+        patch_df = patch_df.drop_duplicates(['codigo', 'centro'], keep='last')
+        
+        patched = patch_analysis(analysis, metrics, patch_df)
+        if patched is None:
+            return False
+        resultado, metrics = patched
+        
+        # Parametros e inventario en memoria (si estan cargados)
+        otros = {}
+        for name in ('parametros', 'inventario'):
+            frame, _ = _registry.cache(name).peek()
+            if frame is None:
+                continue
+            patched = _patch_frame(frame[0], patch_df)
+            if patched is None:
+                return False
+            otros[name] = compact_inventory(patched[0]) if name == 'inventario' else patched[0]
+        
+        # Los datos quedan al dia con la version que ya incluye la edicion
+        for name, frame in otros.items():
+            cache = _registry.cache(name)
+            cache.publish((frame, {}), cache.version_fn())
+        analisis_cache.publish((resultado, metrics), analisis_cache.version_fn())
+        
+        print("Parche incremental: " + str(len(patch_df)) + " materiales reclasificados")
+        return True
+        
+    except Exception as e:
+        print("No se pudo aplicar el parche incremental:", str(e))
+        return False
@@ -0,0 +1,439 @@
+"""
+Backend local de Google Sheets (en memoria o SQLite)
+JAC Engineering SAS
+PARA PRUEBAS Y BENCHMARKS SIN RED
+
+Se activa con la variable de entorno JAC_SHEETS_BACKEND=local.
+Imita la parte de gspread que usa GoogleSheetsHandler, de modo que todo
+el handler (cache, escrituras diferenciales, planificador) se ejercita igual.
+
+Variables de entorno:
+    JAC_LOCAL_SHEETS_DB         ruta SQLite para persistir (vacio = solo memoria)
+    JAC_LOCAL_LATENCY_MS        latencia simulada por solicitud (default 0)
+    JAC_LOCAL_QUOTA_PER_MINUTE  solicitudes/minuto antes de responder 429 (0 = sin limite)
+    JAC_LOCAL_FAILURE_RATE      probabilidad de responder 503 (default 0)
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import gspread
+from gspread.utils import a1_range_to_grid_range, rowcol_to_a1, numericise
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.google_sheets_handler import GoogleSheetsHandler
+from src.sheets_scheduler import get_scheduler
+
+_shared_local_client = None
+_local_client_lock = threading.Lock()
+
+
+class LocalAPIError(Exception):
+    """Error simulado de la API (mismo atributo .code que gspread.APIError)"""
+    
+    def __init__(self, code, message):
+        super().__init__("LocalAPIError: [" + str(code) + "]: " + message)
+        self.code = code
+
+
+def _formatted(value):
+    """Valor como lo devuelve la API con FORMATTED_VALUE"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _strip_sheet_name(a1_range):
+    return a1_range.split('!')[-1] if a1_range else 'A1'
+
+
+class LocalSheetsStore:
+    """Guarda las hojas como matrices de celdas; opcionalmente en SQLite"""
+    
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.grids = {}
+        self.sizes = {}
+        self.versions = {}
+        
+        if db_path:
+            with sqlite3.connect(db_path) as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS hojas ("
+                    "sheet_id TEXT, titulo TEXT, datos TEXT, filas INTEGER, columnas INTEGER, "
+                    "PRIMARY KEY (sheet_id, titulo))"
+                )
+                for sheet_id, titulo, datos, filas, columnas in conn.execute(
+                    "SELECT sheet_id, titulo, datos, filas, columnas FROM hojas"
+                ):
+                    self.grids[(sheet_id, titulo)] = json.loads(datos)
+                    self.sizes[(sheet_id, titulo)] = [filas, columnas]
+    
+    def titles(self, sheet_id):
+        return [t for (s, t) in self.grids if s == sheet_id]
+    
+    def touch(self, sheet_id):
+        self.versions[sheet_id] = self.versions.get(sheet_id, 0) + 1
+    
+    def save(self, sheet_id, titulo):
+        """Persiste una hoja (si hay SQLite) y marca la spreadsheet como modificada"""
+        self.touch(sheet_id)
+        
+        if not self.db_path:
+            return
+        
+        filas, columnas = self.sizes[(sheet_id, titulo)]
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO hojas VALUES (?, ?, ?, ?, ?)",
+                (sheet_id, titulo, json.dumps(self.grids[(sheet_id, titulo)]), filas, columnas)
+            )
+    
+    def delete(self, sheet_id, titulo):
+        """Borra una hoja persistida (si hay SQLite) y marca la spreadsheet como modificada"""
+        self.touch(sheet_id)
+        
+        if not self.db_path:
+            return
+        
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM hojas WHERE sheet_id = ? AND titulo = ?", (sheet_id, titulo))
+
+
+class LocalSheetsClient:
+    """Sustituto de gspread.Client con latencia, cuota y fallas simuladas"""
+    
+    def __init__(self, db_path=None, latency_ms=0, quota_per_minute=0, failure_rate=0.0):
+        self.store = LocalSheetsStore(db_path)
+        self.latency = latency_ms / 1000.0
+        self.quota_per_minute = quota_per_minute
+        self.failure_rate = failure_rate
+        self.request_count = 0
+        self._recent = deque()
+        self._recent_lock = threading.Lock()
+    
+    def call(self, kind, fn, key=None):
+        """Una 'solicitud' a la API: pasa por el planificador como las reales"""
+        return get_scheduler().run(kind, lambda: self._simulate(fn), key=key)
+    
+    def _simulate(self, fn):
+        with self._recent_lock:
+            self.request_count += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if self.quota_per_minute and len(self._recent) >= self.quota_per_minute:
+                raise LocalAPIError(429, "Quota exceeded (simulado)")
+            self._recent.append(now)
+        
+        if self.latency:
+            time.sleep(self.latency)
+        
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise LocalAPIError(503, "The service is currently unavailable (simulado)")
+        
+        with self.store.lock:
+            return fn()
+    
+    def open_by_key(self, key):
+        return self.call('read', lambda: LocalSpreadsheet(self, key))
+
+
+class LocalSpreadsheet:
+
+    def __init__(self, client, sheet_id):
+        self.client = client
+        self.id = sheet_id
+    
+    def worksheet(self, title):
+        def buscar():
+            if (self.id, title) not in self.client.store.grids:
+                raise gspread.exceptions.WorksheetNotFound(title)
+            return LocalWorksheet(self, title)
+        return self.client.call('read', buscar)
+    
+    def add_worksheet(self, title, rows, cols, index=None):
+        def crear():
+            store = self.client.store
+            if (self.id, title) in store.grids:
+                raise LocalAPIError(400, 'A sheet with the name "' + title + '" already exists')
+            store.grids[(self.id, title)] = []
+            store.sizes[(self.id, title)] = [rows, cols]
+            store.save(self.id, title)
+            return LocalWorksheet(self, title)
+        return self.client.call('write', crear)
+    
+    def del_worksheet(self, worksheet):
+        def borrar():
+            store = self.client.store
+            store.grids.pop(worksheet.key, None)
+            store.sizes.pop(worksheet.key, None)
+            store.delete(self.id, worksheet.title)
+        return self.client.call('write', borrar)
+
+
+class LocalWorksheet:
+
+    def __init__(self, spreadsheet, title):
+        self.spreadsheet = spreadsheet
+        self.client = spreadsheet.client
+        self.title = title
+        self.key = (spreadsheet.id, title)
+        
+        # Tamano de la hoja al abrir el handle: como en gspread, row_count y
+        # col_count no cambian si la hoja crece o se achica despues
+        self._size = list(self.client.store.sizes[self.key])
+    
+    # ---------------- estado interno ----------------
+    
+    @property
+    def _grid(self):
+        return self.client.store.grids[self.key]
+    
+    @property
+    def _live_size(self):
+        """Tamano actual de la hoja en el store (el que usa la API para validar rangos)"""
+        return self.client.store.sizes[self.key]
+    
+    @property
+    def row_count(self):
+        return self._size[0]
+    
+    @property
+    def col_count(self):
+        return self._size[1]
+    
+    def _used_rows(self):
+        """Filas hasta la ultima no vacia (la API recorta las vacias del final)"""
+        grid = self._grid
+        last = len(grid)
+        while last > 0 and all(v in ('', None) for v in grid[last - 1]):
+            last -= 1
+        return grid[:last]
+    
+    def _bounds(self, a1_range):
+        rows, cols = self._live_size
+        if a1_range is None:
+            # Sin rango: toda la hoja (como worksheet.get() en gspread)
+            return 0, rows, 0, cols
+        g = a1_range_to_grid_range(_strip_sheet_name(a1_range))
+        r0 = g.get('startRowIndex', 0)
+        r1 = g.get('endRowIndex', rows)
+        c0 = g.get('startColumnIndex', 0)
+        c1 = g.get('endColumnIndex', cols)
+        return r0, r1, c0, c1
+    
+    def _read(self, a1_range, unformatted=False):
+        r0, r1, c0, c1 = self._bounds(a1_range)
+        rows = []
+        for row in self._used_rows()[r0:r1]:
+            cells = list(row[c0:c1])
+            while cells and cells[-1] in ('', None):
+                cells.pop()
+            rows.append(cells if unformatted else [_formatted(v) for v in cells])
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+    
+    def _write(self, a1_range, values):
+        r0, _, c0, _ = self._bounds(a1_range)
+        r_end = r0 + len(values)
+        c_end = c0 + max((len(v) for v in values), default=0)
+        
+        rows, cols = self._live_size
+        if r_end > rows or c_end > cols:
+            raise LocalAPIError(
+                400,
+                "Range (" + self.title + "!" + a1_range + ") exceeds grid limits. Max rows: " +
+                str(rows) + ", max columns: " + str(cols)
+            )
+        
+        grid = self._grid
+        while len(grid) < r_end:
+            grid.append([])
+        for i, row in enumerate(values):
+            target = grid[r0 + i]
+            while len(target) < c0 + len(row):
+                target.append('')
+            for j, value in enumerate(row):
+                target[c0 + j] = value
+    
+    # ---------------- API tipo gspread ----------------
+    
+    def get_all_values(self):
+        return self.client.call(
+            'read',
+            lambda: [[_formatted(v) for v in row] for row in self._padded()],
+            key=self.key + ('all',)
+        )
+    
+    def _padded(self):
+        rows = self._used_rows()
+        width = max((len(r) for r in rows), default=0)
+        return [list(r) + [''] * (width - len(r)) for r in rows]
+    
+    def get_all_records(self):
+        def leer():
+            rows = [[_formatted(v) for v in row] for row in self._padded()]
+            if len(rows) < 2:
+                return []
+            header = rows[0]
+            return [
+                dict(zip(header, [numericise(v) for v in row]))
+                for row in rows[1:]
+            ]
+        return self.client.call('read', leer, key=self.key + ('records',))
+    
+    def row_values(self, row):
+        def leer():
+            values = self._read(rowcol_to_a1(row, 1) + ':' + rowcol_to_a1(row, max(self._live_size[1], 1)))
+            return values[0] if values else []
+        return self.client.call('read', leer)
+    
+    def get(self, range_name=None, value_render_option=None, **kwargs):
+        unformatted = value_render_option == 'UNFORMATTED_VALUE'
+        return self.client.call(
+            'read',
+            lambda: self._read(range_name, unformatted),
+            key=self.key + ('get', range_name, unformatted)
+        )
+    
+    def batch_get(self, ranges, value_render_option=None, **kwargs):
+        unformatted = value_render_option == 'UNFORMATTED_VALUE'
+        return self.client.call(
+            'read',
+            lambda: [self._read(r, unformatted) for r in ranges],
+            key=self.key + ('batch_get', tuple(ranges), unformatted)
+        )
+    
+    def update(self, *args, range_name=None, values=None, **kwargs):
+        # Acepta update('A1', values), update(values, 'A1') y argumentos con nombre
+        positional = list(args)
+        for value in positional:
+            if isinstance(value, str):
+                range_name = value
+            else:
+                values = value
+        
+        def escribir():
+            self._write(range_name or 'A1', values)
+            self.client.store.save(*self.key)
+        return self.client.call('write', escribir)
+    
+    def batch_update(self, data, **kwargs):
+        def escribir():
+            for item in data:
+                self._write(item['range'], item['values'])
+            self.client.store.save(*self.key)
+        return self.client.call('write', escribir)
+    
+    def append_rows(self, values, value_input_option=None, insert_data_option=None,
+                    table_range=None, **kwargs):
+        def agregar():
+            start = len(self._used_rows())
+            needed = start + len(values)
+            width = max((len(v) for v in values), default=0)
+            
+            sizes = self.client.store.sizes[self.key]
+            sizes[0] = max(sizes[0], needed)
+            sizes[1] = max(sizes[1], width)
+            
+            self._write(rowcol_to_a1(start + 1, 1), values)
+            self.client.store.save(*self.key)
+            
+            updated = rowcol_to_a1(start + 1, 1) + ':' + rowcol_to_a1(needed, max(width, 1))
+            return {'updates': {'updatedRange': "'" + self.title + "'!" + updated}}
+        return self.client.call('write', agregar)
+    
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+    
+    def clear(self):
+        def limpiar():
+            self.client.store.grids[self.key] = []
+            self.client.store.save(*self.key)
+        return self.client.call('write', limpiar)
+    
+    def resize(self, rows=None, cols=None):
+        """Tamano absoluto, como en gspread: si es menor que el actual se borran filas o columnas"""
+        def redimensionar():
+            store = self.client.store
+            sizes = store.sizes[self.key]
+            if rows is not None:
+                sizes[0] = rows
+                del store.grids[self.key][rows:]
+                self._size[0] = rows
+            if cols is not None:
+                sizes[1] = cols
+                for row in store.grids[self.key]:
+                    del row[cols:]
+                self._size[1] = cols
+            store.save(*self.key)
+        return self.client.call('write', redimensionar)
+    
+    def add_rows(self, rows):
+        # Igual que gspread: parte del tamano guardado en el handle
+        return self.resize(rows=self.row_count + rows)
+    
+    def add_cols(self, cols):
+        return self.resize(cols=self.col_count + cols)
+
+
+def get_local_client():
+    """Cliente local compartido por el proceso, configurado por variables de entorno"""
+    global _shared_local_client
+    
+    with _local_client_lock:
+        if _shared_local_client is None:
+            _shared_local_client = LocalSheetsClient(
+                db_path=os.environ.get('JAC_LOCAL_SHEETS_DB') or None,
+                latency_ms=float(os.environ.get('JAC_LOCAL_LATENCY_MS', 0)),
+                quota_per_minute=int(os.environ.get('JAC_LOCAL_QUOTA_PER_MINUTE', 0)),
+                failure_rate=float(os.environ.get('JAC_LOCAL_FAILURE_RATE', 0))
+            )
+            print("Usando backend local de Sheets (sin red)")
+        return _shared_local_client
+
+
+class LocalSheetsHandler(GoogleSheetsHandler):
+    """Mismo interfaz que GoogleSheetsHandler, sobre el backend local"""
+    
+    def _authenticate(self):
+        self.client = get_local_client()
+    
+    def get_spreadsheet_version(self, sheet_id):
+        """Contador de modificaciones de la spreadsheet (equivale a modifiedTime)"""
+        store = self.client.store
+        return self.client.call(
+            'read',
+            lambda: str(store.versions.get(sheet_id, 0)),
+            key=('version', sheet_id)
+        )
+    
+    def seed_dataframe(self, df, sheet_id, sheet_name):
+        """Crea (o reemplaza) una hoja con el contenido de df, sin pasar por la cuota"""
+        store = self.client.store
+        values = [df.columns.tolist()] + df.astype(object).where(df.notna(), '').values.tolist()
+        
+        with store.lock:
+            store.grids[(sheet_id, sheet_name)] = values
+            store.sizes[(sheet_id, sheet_name)] = [
+                max(1000, len(values)),
+                max(26, len(df.columns))
+            ]
+            store.save(sheet_id, sheet_name)
+        
+        self._forget_sheet_state(sheet_id, sheet_name)
+        self._headers.pop((sheet_id, sheet_name), None)
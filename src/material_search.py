@@ -0,0 +1,65 @@
+"""
+Busqueda de materiales compartida por todas las paginas
+JAC Engineering SAS
+UN INDICE POR DATASET Y VERSION, PARA TODAS LAS SESIONES
+
+Cada dataset se busca en sus propios campos:
+    analisis     tablero principal (app.py)
+    inventario   agregar materiales a una SOLPED
+    parametros   configuracion de parametros
+El indice (ver search_index) se construye la primera vez que se busca en
+una version del dataset y lo reutilizan todas las sesiones y paginas.
+Los campos de material salen de la clave normalizada que arma
+DataLoaderSheets al cargar (sin tildes, mayusculas ni signos): "cañería",
+"CANERIA" y "Cañeria" encuentran lo mismo. Los demas campos del dataset
+se normalizan igual al construir el indice.
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.inventory_service import get_dataset
+from src.data_loader_sheets import CAMPOS_CLAVE_BUSQUEDA
+from src.search_index import get_search_index, CLAVE_BUSQUEDA
+
+# Campos en los que se busca, por dataset
+CAMPOS_BUSQUEDA = {
+    'analisis': ['codigo', 'descripcion', 'nombre_tecnico', 'ubicacion', 'centro', 'centro_nombre'],
+    'inventario': ['codigo', 'descripcion', 'nombre_tecnico'],
+    'parametros': ['codigo', 'descripcion', 'nombre_tecnico']
+}
+
+
+def search_index_for(dataset):
+    """(df, indice) de la version vigente del dataset"""
+    df = get_dataset(dataset)
+    
+    campos = CAMPOS_BUSQUEDA[dataset]
+    
+    # La clave normalizada de la carga en lugar de los campos que contiene;
+    # los campos sueltos si no esta (ej. un snapshot guardado antes de que existiera)
+    if CLAVE_BUSQUEDA in df.columns:
+        campos = [CLAVE_BUSQUEDA] + [c for c in campos if c not in CAMPOS_CLAVE_BUSQUEDA]
+    return df, get_search_index(df, campos)
+
+
+def buscar_materiales(dataset, termino):
+    """
+    Filas del dataset cuyos campos contienen el termino (todas si esta vacio).
+    Es una vista del dataset compartido: usar .copy() para modificarla.
+    """
+    df, index = search_index_for(dataset)
+    return index.search(df, termino)
+
+
+def buscar_materiales_pagina(dataset, termino, por_pagina=50, pagina=0):
+    """
+    (filas, total): una pagina de las coincidencias ordenadas por relevancia
+    (codigo exacto, prefijo del codigo, inicio de palabra, subcadena) y el
+    total de coincidencias. pagina empieza en 0.
+    """
+    df, index = search_index_for(dataset)
+    posiciones, total = index.ranked(termino, por_pagina, pagina * por_pagina)
+    return df.iloc[posiciones], total
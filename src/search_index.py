@@ -0,0 +1,381 @@
+"""
+Indice invertido de trigramas para buscar materiales
+JAC Engineering SAS
+BUSQUEDA SIN RECORRER TODO EL CATALOGO EN CADA RERUN
+
+Los textos distintos de las columnas indexadas forman un vocabulario (un
+mismo codigo, descripcion o centro aparece en muchas filas). Para cada
+trigrama de bytes UTF-8 del vocabulario se guarda la lista ordenada de
+terminos que lo contienen (postings, numpy); y para cada termino, las filas
+donde aparece.
+
+Una consulta de 3 o mas bytes intersecta las listas de sus trigramas y
+confirma los terminos candidatos como subcadena; una mas corta une las
+listas de los trigramas que la contienen. Luego se pasa de terminos a
+filas. El resultado es el mismo que str.contains sobre cada campo
+normalizado (normalize_values), sin recorrer el catalogo.
+"""
+
+import re
+import threading
+import unicodedata
+import weakref
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Separador entre campos y terminos: nunca queda en una consulta normalizada
+SEP = '\x1f'
+
+# Columna con la clave de busqueda normalizada (ver search_key)
+CLAVE_BUSQUEDA = 'clave_busqueda'
+
+# Lo que no es letra ni numero (\\p{L} y \\p{N} de normalize_values); incluye SEP
+_NO_ALFANUMERICO = re.compile(r'[\W_]+')
+
+# Consultas de 1 o 2 bytes que se recuerdan por indice
+MAX_CONSULTAS_CORTAS = 256
+
+# Rankings que se recuerdan por indice (para pasar de pagina sin recalcular)
+MAX_RANKINGS = 16
+
+# Niveles de relevancia de ranked (menor = mas relevante)
+NIVEL_CODIGO_EXACTO = 0
+NIVEL_CODIGO_PREFIJO = 1
+NIVEL_PALABRA = 2
+NIVEL_SUBCADENA = 3
+
+
+def _text_array(serie):
+    """Columna como texto de pyarrow ('' para NaN)"""
+    textos = serie.astype(str).where(serie.notna(), '')
+    return pa.array(textos.to_numpy(dtype=object), type=pa.string())
+
+
+def normalize_values(valores):
+    """
+    Normalizacion de busqueda (pyarrow): minusculas, sin tildes ni signos
+    de puntuacion y con un solo espacio entre palabras.
+    "CAÑERÍA  1/2\"" -> "caneria 1 2". Conserva SEP.
+    """
+    valores = pc.utf8_normalize(pc.utf8_lower(valores), 'NFKD')
+    valores = pc.replace_substring_regex(valores, r'\p{M}+', '')
+    valores = pc.replace_substring_regex(valores, r'[^\p{L}\p{N}\x1f]+', ' ')
+    return pc.utf8_trim_whitespace(valores)
+
+
+def normalize_text(consulta):
+    """
+    Una consulta normalizada como las claves de busqueda. Mismas reglas que
+    normalize_values en Python puro: para un solo texto es mucho mas rapido
+    que compilar las expresiones de pyarrow en cada consulta.
+    """
+    if consulta is None or (not isinstance(consulta, str) and pd.isna(consulta)):
+        return ''
+    texto = unicodedata.normalize('NFKD', str(consulta).lower())
+    texto = ''.join(c for c in texto if not unicodedata.category(c).startswith('M'))
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def search_key(df, columns):
+    """
+    Clave de busqueda de cada fila: los campos indicados normalizados y
+    separados por SEP (una coincidencia nunca cruza de un campo a otro).
+    Se calcula una vez al cargar los datos.
+    """
+    campos = [normalize_values(_text_array(df[col])) for col in columns if col in df.columns]
+    
+    if not campos:
+        return pd.Series('', index=df.index, dtype=object)
+    
+    clave = pc.binary_join_element_wise(*campos, SEP) if len(campos) > 1 else campos[0]
+    return pd.Series(clave.to_numpy(zero_copy_only=False), index=df.index, dtype=object)
+
+
+def _radix_argsort(claves):
+    """argsort estable de enteros de 24 bits en dos pasadas de radix (16 + 8 bits)"""
+    orden = np.argsort((claves & 0xFFFF).astype(np.uint16), kind='stable')
+    alto = (claves >> 16).astype(np.uint8)[orden]
+    return orden[np.argsort(alto, kind='stable')]
+
+
+def _gather(offsets, valores, grupos):
+    """Concatenacion de valores[offsets[g]:offsets[g + 1]] para cada g de grupos, sin bucle"""
+    inicios = offsets[grupos]
+    largos = offsets[grupos + 1] - inicios
+    total = int(largos.sum())
+    if not total:
+        return valores[:0]
+    
+    saltos = np.repeat(inicios - np.concatenate(([0], np.cumsum(largos)[:-1])), largos)
+    return valores[saltos + np.arange(total)]
+
+
+def _csr(grupos, valores):
+    """(grupos unicos, offsets, valores) agrupando valores por grupo; grupos ya ordenados"""
+    if not len(grupos):
+        return np.empty(0, dtype=grupos.dtype), np.zeros(1, dtype=np.int64), valores
+    
+    nuevo = np.flatnonzero(np.r_[True, grupos[1:] != grupos[:-1]])
+    offsets = np.append(nuevo, len(grupos)).astype(np.int64)
+    return grupos[nuevo], offsets, valores
+
+
+class SearchIndex:
+    """
+    Indice de trigramas sobre las columnas indicadas de df.
+    candidates(consulta) -> posiciones (iloc) de las filas donde algun campo
+    contiene la consulta normalizada, en orden ascendente.
+    """
+    
+    def __init__(self, df, columns):
+        self.columns = [col for col in columns if col in df.columns]
+        self.size = len(df)
+        
+        self._lock = threading.Lock()
+        self._cortas = {}
+        self._rankings = {}
+        
+        # La clave de busqueda ya viene normalizada desde la carga
+        valores = [
+            _text_array(df[col]) if col == CLAVE_BUSQUEDA else normalize_values(_text_array(df[col]))
+            for col in self.columns
+        ]
+        
+        if valores and self.size:
+            codificado = pa.concat_arrays(valores).dictionary_encode()
+            self._vocab = codificado.dictionary
+            ids = codificado.indices.to_numpy(zero_copy_only=False).astype(np.int32)
+        else:
+            self._vocab = pa.array([], type=pa.string())
+            ids = np.empty(0, dtype=np.int32)
+        
+        # Termino de cada (columna, fila)
+        self._ids = ids.reshape(len(self.columns), self.size) if len(ids) else np.empty((0, self.size), dtype=np.int32)
+        
+        self._build_terms()
+        self._build_grams()
+    
+    def _build_terms(self):
+        """Filas de cada termino del vocabulario"""
+        ids = self._ids.ravel()
+        filas = np.tile(np.arange(self.size, dtype=np.int32), len(self.columns))
+        
+        orden = np.argsort(ids, kind='stable')
+        self._terms, self._term_offsets, self._term_rows = _csr(ids[orden], filas[orden])
+    
+    def _build_grams(self):
+        """Terminos de cada trigrama de bytes"""
+        docs = pc.binary_join_element_wise('', self._vocab, '', SEP).cast(pa.large_string())
+        
+        if isinstance(docs, pa.ChunkedArray):
+            docs = docs.combine_chunks()
+        
+        offsets = np.frombuffer(docs.buffers()[1], dtype=np.int64)[docs.offset:docs.offset + len(docs) + 1]
+        data = np.frombuffer(docs.buffers()[2], dtype=np.uint8)[offsets[0]:offsets[-1]] if len(docs) else np.empty(0, dtype=np.uint8)
+        terminos = np.repeat(np.arange(len(docs), dtype=np.int32), np.diff(offsets))
+        
+        if len(data) < 3:
+            self._grams = np.empty(0, dtype=np.uint32)
+            self._gram_offsets = np.zeros(1, dtype=np.int64)
+            self._gram_terms = np.empty(0, dtype=np.int32)
+            return
+        
+        data = data.astype(np.uint32)
+        grams = (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+        
+        # Solo trigramas dentro de un mismo termino
+        mismo = terminos[:-2] == terminos[2:]
+        grams = grams[mismo]
+        terminos = terminos[:-2][mismo]
+        
+        # Los terminos ya vienen en orden: el orden estable los deja ordenados por trigrama
+        orden = _radix_argsort(grams)
+        grams = grams[orden]
+        terminos = terminos[orden]
+        
+        nuevo = np.r_[True, (grams[1:] != grams[:-1]) | (terminos[1:] != terminos[:-1])]
+        self._grams, self._gram_offsets, self._gram_terms = _csr(grams[nuevo], terminos[nuevo])
+    
+    def _gram_posting(self, i):
+        return self._gram_terms[self._gram_offsets[i]:self._gram_offsets[i + 1]]
+    
+    def _lookup_gram(self, gram):
+        i = np.searchsorted(self._grams, gram)
+        if i < len(self._grams) and self._grams[i] == gram:
+            return self._gram_posting(i)
+        return None
+    
+    def _matching_terms(self, q):
+        """Terminos del vocabulario que contienen q (ordenados)"""
+        b = q.encode('utf-8')
+        
+        if len(b) < 3:
+            return self._short_terms(q, b)
+        
+        grams = {(b[i] << 16) | (b[i + 1] << 8) | b[i + 2] for i in range(len(b) - 2)}
+        
+        listas = []
+        for gram in grams:
+            posting = self._lookup_gram(gram)
+            if posting is None:
+                return np.empty(0, dtype=np.int32)
+            listas.append(posting)
+        
+        listas.sort(key=len)
+        resultado = listas[0]
+        for posting in listas[1:]:
+            if not len(resultado):
+                break
+            resultado = np.intersect1d(resultado, posting, assume_unique=True)
+        
+        if len(b) == 3 or not len(resultado):
+            return resultado
+        
+        # Los trigramas pueden estar en otro orden dentro del termino
+        coincide = pc.match_substring(self._vocab.take(pa.array(resultado)), q)
+        return resultado[coincide.to_numpy(zero_copy_only=False)]
+    
+    def _short_terms(self, q, b):
+        """Consultas de 1 o 2 bytes: union de los trigramas que las contienen"""
+        with self._lock:
+            if q in self._cortas:
+                return self._cortas[q]
+        
+        c0 = self._grams >> 16
+        c1 = (self._grams >> 8) & 0xFF
+        c2 = self._grams & 0xFF
+        
+        if len(b) == 1:
+            coincide = (c0 == b[0]) | (c1 == b[0]) | (c2 == b[0])
+        else:
+            coincide = ((c0 == b[0]) & (c1 == b[1])) | ((c1 == b[0]) & (c2 == b[1]))
+        
+        resultado = np.unique(_gather(self._gram_offsets, self._gram_terms, np.flatnonzero(coincide)))
+        
+        with self._lock:
+            if len(self._cortas) >= MAX_CONSULTAS_CORTAS:
+                self._cortas.clear()
+            self._cortas[q] = resultado
+        return resultado
+    
+    def _rows(self, terminos):
+        """Filas (ordenadas) donde aparece alguno de los terminos"""
+        posiciones = np.searchsorted(self._terms, terminos)
+        offsets = self._term_offsets
+        
+        if (offsets[posiciones + 1] - offsets[posiciones]).sum() > self.size:
+            # Muchas filas: una pasada por la tabla de terminos sale mas barata
+            marcado = np.zeros(len(self._vocab), dtype=bool)
+            marcado[terminos] = True
+            return np.flatnonzero(marcado[self._ids].any(axis=0)).astype(np.int32)
+        
+        return np.unique(_gather(offsets, self._term_rows, posiciones))
+    
+    def candidates(self, consulta):
+        """Posiciones de las filas que contienen la consulta (todas si esta vacia)"""
+        q = normalize_text(consulta)
+        
+        if not q:
+            return np.arange(self.size, dtype=np.int32)
+        
+        return self._rows(self._matching_terms(q))
+    
+    def search(self, df, consulta):
+        """Filas de df (el mismo DataFrame indexado) que contienen la consulta"""
+        return df.iloc[self.candidates(consulta)]
+    
+    def _levels(self, q, filas):
+        """
+        Nivel de relevancia de cada fila candidata. El codigo es el primer
+        campo de la primera columna (la clave de busqueda empieza por el).
+        """
+        textos = [self._vocab.take(pa.array(self._ids[c][filas])) for c in range(len(self.columns))]
+        
+        con_sep = pc.binary_join_element_wise(textos[0], '', SEP)
+        exacto = pc.starts_with(con_sep, q + SEP)
+        prefijo = pc.starts_with(textos[0], q)
+        
+        palabra = np.zeros(len(filas), dtype=bool)
+        for texto in textos:
+            inicio = pc.or_(
+                pc.starts_with(texto, q),
+                pc.or_(pc.match_substring(texto, ' ' + q), pc.match_substring(texto, SEP + q))
+            )
+            palabra |= inicio.to_numpy(zero_copy_only=False)
+        
+        return np.select(
+            [exacto.to_numpy(zero_copy_only=False), prefijo.to_numpy(zero_copy_only=False), palabra],
+            [NIVEL_CODIGO_EXACTO, NIVEL_CODIGO_PREFIJO, NIVEL_PALABRA],
+            default=NIVEL_SUBCADENA
+        )
+    
+    def ranked(self, consulta, k, offset=0):
+        """
+        (posiciones, total): las filas offset..offset+k de las coincidencias
+        ordenadas por relevancia (codigo exacto, prefijo del codigo, inicio de
+        palabra, subcadena; a igual nivel, el orden del DataFrame) y el total
+        de coincidencias. Solo se ordena la parte necesaria (argpartition).
+        """
+        q = normalize_text(consulta)
+        
+        if not q:
+            return np.arange(offset, min(offset + k, self.size), dtype=np.int32), self.size
+        
+        with self._lock:
+            ranking = self._rankings.get(q)
+        
+        if ranking is None:
+            filas = self._rows(self._matching_terms(q))
+            puntaje = self._levels(q, filas).astype(np.int64) * self.size + filas
+            ranking = (filas, puntaje)
+            
+            with self._lock:
+                if len(self._rankings) >= MAX_RANKINGS:
+                    self._rankings.clear()
+                self._rankings[q] = ranking
+        
+        filas, puntaje = ranking
+        total = len(filas)
+        fin = min(offset + k, total)
+        
+        if offset >= fin:
+            return np.empty(0, dtype=np.int32), total
+        
+        if fin < total:
+            primeros = np.argpartition(puntaje, fin - 1)[:fin]
+        else:
+            primeros = np.arange(total)
+        
+        orden = primeros[np.argsort(puntaje[primeros])][offset:fin]
+        return filas[orden], total
+
+
+# Un indice por DataFrame vivo; se descarta cuando el DataFrame se libera
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def get_search_index(df, columns):
+    """
+    Indice de df sobre columns, construido una sola vez por DataFrame.
+    Los datasets compartidos se reemplazan (no se modifican) al cambiar la
+    version de las hojas, asi cada version de los datos tiene su indice.
+    """
+    clave = (id(df), tuple(columns))
+    
+    with _indices_lock:
+        entrada = _indices.get(clave)
+        if entrada is not None and entrada[0]() is df:
+            return entrada[1]
+    
+    index = SearchIndex(df, columns)
+    
+    with _indices_lock:
+        for k in [k for k, (ref, _) in _indices.items() if ref() is None]:
+            del _indices[k]
+        _indices[clave] = (weakref.ref(df), index)
+    
+    return index
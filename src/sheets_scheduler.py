@@ -0,0 +1,168 @@
+"""
+Planificador de solicitudes a Google Sheets
+JAC Engineering SAS
+CUOTA POR MINUTO, REINTENTOS CON BACKOFF Y LECTURAS COMPARTIDAS
+"""
+
+import random
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.google_config import SHEETS_QUOTA
+
+# Codigos que se reintentan por tipo de solicitud. Una escritura solo en 429:
+# con 5xx pudo haberse aplicado y repetirla duplicaria filas (values:append)
+RETRYABLE_STATUS = {
+    'read': {429, 500, 502, 503, 504},
+    'write': {429}
+}
+
+_shared_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _status_code(error):
+    """Codigo HTTP de un error de la API (gspread o backend local)"""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def _retry_after(error):
+    """Segundos indicados por el header Retry-After, si viene"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Cubeta de tokens: 'rate_per_minute' solicitudes/minuto con rafagas de 'capacity'"""
+    
+    def __init__(self, rate_per_minute, capacity):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Bloquea hasta obtener un token"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                wait = (1 - self.tokens) / self.rate
+            
+            time.sleep(wait)
+
+
+class _InflightCall:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestScheduler:
+    """
+    Todas las solicitudes a la API pasan por aqui:
+    - una cubeta de tokens para lecturas y otra para escrituras (cuota por minuto)
+    - reintentos con backoff exponencial y jitter en 429 y 5xx (escrituras solo en 429)
+    - lecturas identicas en curso se comparten (una sola solicitud)
+    """
+    
+    def __init__(self, read_per_minute=60, write_per_minute=60, burst=10,
+                 max_retries=5, base_delay=1.0, max_delay=32.0):
+        self.buckets = {
+            'read': TokenBucket(read_per_minute, burst),
+            'write': TokenBucket(write_per_minute, burst)
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+    
+    def run(self, kind, fn, key=None):
+        """
+        Ejecuta fn() respetando la cuota de 'kind' ('read' o 'write').
+        key: identifica una lectura para compartirla con llamadas identicas en curso.
+        """
+        if key is None or kind != 'read':
+            return self._run_with_retries(kind, fn)
+        
+        with self._inflight_lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _InflightCall()
+                self._inflight[key] = call
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = self._run_with_retries(kind, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+    
+    def _run_with_retries(self, kind, fn):
+        bucket = self.buckets[kind]
+        attempt = 0
+        
+        while True:
+            bucket.acquire()
+            try:
+                return fn()
+            except Exception as e:
+                status = _status_code(e)
+                if status not in RETRYABLE_STATUS[kind] or attempt >= self.max_retries:
+                    raise
+                
+                # Backoff exponencial con jitter completo
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                delay = max(delay, _retry_after(e) or 0)
+                print("Sheets API " + str(status) + ", reintento " + str(attempt + 1) +
+                      " en " + str(round(delay, 1)) + "s")
+                time.sleep(delay)
+                attempt += 1
+
+
+def get_scheduler():
+    """Planificador compartido por todo el proceso (la cuota es por proyecto)"""
+    global _shared_scheduler
+    
+    with _scheduler_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = RequestScheduler(
+                read_per_minute=SHEETS_QUOTA['read_requests_per_minute'],
+                write_per_minute=SHEETS_QUOTA['write_requests_per_minute'],
+                burst=SHEETS_QUOTA['burst'],
+                max_retries=SHEETS_QUOTA['max_retries']
+            )
+        return _shared_scheduler
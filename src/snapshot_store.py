@@ -0,0 +1,260 @@
+"""
+Snapshots en disco (Parquet) con stale-while-revalidate
+JAC Engineering SAS
+ARRANQUE EN FRIO SIN ESPERAR A GOOGLE SHEETS
+
+Cada snapshot son dos archivos en data/processed/:
+    <nombre>_<hash>.parquet   el DataFrame
+    <nombre>.json             version de las hojas, metadatos y archivo parquet vigente
+Ambos se escriben en un temporal y se publican con os.replace (atomico),
+asi un proceso que lee nunca ve un snapshot a medio escribir.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import PROCESSED_DATA_DIR, DATETIME_FORMAT
+
+
+def _json_value(value):
+    """Convierte tipos numpy/pandas para json.dump"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _parquet_ready(df):
+    """
+    Copia de df que pyarrow puede escribir: las columnas object con tipos
+    mezclados (ej. numeros y texto en la misma columna) pasan a texto
+    """
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+            df[col] = df[col].astype(str).where(df[col].notna())
+    return df
+
+
+def _write_atomic(path, write):
+    """Escribe con write(tmp) y publica con os.replace"""
+    tmp = path + '.tmp' + str(os.getpid()) + '_' + str(threading.get_ident())
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+_save_lock = threading.Lock()
+
+
+def save_snapshot(name, df, version, meta=None, directory=PROCESSED_DATA_DIR):
+    """Guarda df como snapshot versionado; devuelve True si se pudo escribir"""
+    with _save_lock:
+        return _save_snapshot(name, df, version, meta, directory)
+
+
+def _save_snapshot(name, df, version, meta, directory):
+    try:
+        os.makedirs(directory, exist_ok=True)
+        
+        etiqueta = hashlib.sha1(json.dumps(version, default=_json_value).encode('utf-8')).hexdigest()[:12]
+        parquet_name = name + '_' + etiqueta + '.parquet'
+        parquet_path = os.path.join(directory, parquet_name)
+        
+        _write_atomic(parquet_path, lambda tmp: _parquet_ready(df).to_parquet(tmp))
+        
+        sidecar = {
+            'version': version,
+            'archivo': parquet_name,
+            'filas': len(df),
+            'guardado': datetime.now().strftime(DATETIME_FORMAT),
+            'meta': meta or {}
+        }
+        
+        def escribir_json(tmp):
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(sidecar, f, default=_json_value, ensure_ascii=False)
+        
+        _write_atomic(os.path.join(directory, name + '.json'), escribir_json)
+        
+        # Los parquet anteriores ya no los referencia nadie
+        for viejo in glob.glob(os.path.join(directory, name + '_*.parquet')):
+            if os.path.basename(viejo) != parquet_name:
+                try:
+                    os.remove(viejo)
+                except OSError:
+                    pass
+        
+        return True
+    
+    except Exception as e:
+        print("No se pudo guardar el snapshot " + name + ":", str(e))
+        return False
+
+
+def load_snapshot(name, directory=PROCESSED_DATA_DIR):
+    """(df, version, meta) del ultimo snapshot, o None si no hay uno valido"""
+    try:
+        with open(os.path.join(directory, name + '.json'), encoding='utf-8') as f:
+            sidecar = json.load(f)
+        
+        df = pd.read_parquet(os.path.join(directory, sidecar['archivo']))
+        version = sidecar['version']
+        if isinstance(version, list):
+            version = tuple(version)
+        
+        return df, version, sidecar.get('meta', {})
+    
+    except FileNotFoundError:
+        return None
+    
+    except Exception as e:
+        print("Snapshot " + name + " no valido:", str(e))
+        return None
+
+
+class _Refresh:
+    """Una reconstruccion en curso; los demas llamadores esperan su resultado"""
+    
+    def __init__(self, version):
+        self.version = version
+        self.event = threading.Event()
+        self.result = None
+
+
+class SnapshotCache:
+    """
+    Un dataset en memoria del proceso, respaldado por un snapshot en disco.
+    
+    get() devuelve (df, meta) de inmediato si hay algo en memoria o en disco;
+    si la version de las hojas cambio, lo actualiza en un hilo de fondo
+    (stale-while-revalidate). Solo sin ningun dato se construye en linea.
+    get(wait=True) en cambio espera la version vigente (para dependencias).
+    
+    Single-flight: nunca hay mas de una reconstruccion a la vez; quien llega
+    mientras una esta en curso espera ese mismo resultado (o recibe el dato
+    anterior si no pidio wait).
+    
+    build() -> (df, meta) o None si no hay datos
+    version_fn() -> version actual de las hojas (ver get_data_version)
+    persist=False: solo memoria, sin snapshot en disco
+    """
+    
+    def __init__(self, name, build, version_fn, persist=True):
+        self.name = name
+        self.build = build
+        self.version_fn = version_fn
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self._disk_checked = False
+        self._inflight = None
+        self.builds = 0
+    
+    def _join_refresh(self, version):
+        """(refresh en curso, True si este llamador debe ejecutarlo); requiere _lock"""
+        if self._inflight is None:
+            self._inflight = _Refresh(version)
+            return self._inflight, True
+        return self._inflight, False
+    
+    def get(self, wait=False):
+        version = self.version_fn()
+        
+        with self._lock:
+            if self.persist and self._value is None and not self._disk_checked:
+                self._disk_checked = True
+                snapshot = load_snapshot(self.name)
+                if snapshot is not None:
+                    df, disk_version, meta = snapshot
+                    self._value = (df, meta)
+                    self._version = disk_version
+                    print("Snapshot " + self.name + " cargado desde disco: " + str(len(df)) + " filas")
+            
+            if self._value is not None and self._version == version:
+                return self._value
+            
+            refresh, leader = self._join_refresh(version)
+            
+            if self._value is not None and not wait:
+                # Se sirve el dato anterior mientras se actualiza en segundo plano
+                if leader:
+                    threading.Thread(target=self._run_refresh, args=(refresh,), daemon=True).start()
+                return self._value
+        
+        if leader:
+            self._run_refresh(refresh)
+        else:
+            refresh.event.wait()
+        
+        return refresh.result if refresh.result is not None else self._value
+    
+    def _run_refresh(self, refresh):
+        """Reconstruye el dataset y publica el resultado en memoria y disco"""
+        inicio = time.perf_counter()
+        try:
+            self.builds += 1
+            result = self.build()
+            
+            if result is None:
+                return
+            
+            df, meta = result
+            with self._lock:
+                self._value = (df, meta)
+                self._version = refresh.version
+            refresh.result = (df, meta)
+            
+            if self.persist:
+                save_snapshot(self.name, df, refresh.version, meta)
+            print("Snapshot " + self.name + " actualizado en " + str(round(time.perf_counter() - inicio, 2)) + " s")
+        
+        except Exception as e:
+            print("ERROR actualizando " + self.name + ":", str(e))
+        
+        finally:
+            with self._lock:
+                self._inflight = None
+            refresh.event.set()
+    
+    def peek(self):
+        """(valor, version) en memoria, sin consultar la version de las hojas"""
+        with self._lock:
+            return self._value, self._version
+    
+    def publish(self, value, version):
+        """Reemplaza el dato (ej. tras un parche incremental); el snapshot se escribe en segundo plano"""
+        with self._lock:
+            self._value = value
+            self._version = version
+        
+        if self.persist:
+            threading.Thread(
+                target=save_snapshot,
+                args=(self.name, value[0], version, value[1]),
+                daemon=True
+            ).start()
+    
+    def clear(self):
+        """Olvida el dato en memoria (el proximo get vuelve a construir)"""
+        with self._lock:
+            self._value = None
+            self._version = None
+    
+    def mark_stale(self):
+        """Conserva el dato pero lo marca desactualizado: se sigue sirviendo mientras se reconstruye"""
+        with self._lock:
+            self._version = None
@@ -0,0 +1,118 @@
+"""
+Contador de numeros de SOLPED
+JAC Engineering SAS
+ASIGNACION ATOMICA SIN LEER EL HISTORIAL
+"""
+
+import re
+import threading
+import time
+import uuid
+import sys
+import os
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.google_config import SHEETS_CONFIG, SOLPED_COUNTER_PREFIX
+
+# Base de numeracion por (sheet_id, anio), compartida por el proceso
+_bases = {}
+_bases_lock = threading.Lock()
+
+
+class SolpedCounter:
+    """
+    Asigna SOLPED-YYYY-NNN con una hoja contador por anio.
+    
+    Fila 1 de la hoja: ['Base', N] donde N es el ultimo numero usado antes
+    de crear el contador. Cada reserva es un append; la API serializa los
+    append, por lo que dos usuarios simultaneos nunca reciben la misma fila.
+    Numero = Base + (fila - 1). Constante en tiempo y sin leer el historial.
+    """
+    
+    def __init__(self, sheets_handler):
+        self.sheets_handler = sheets_handler
+        self.sheet_id = SHEETS_CONFIG['solped']['sheet_id']
+    
+    def next_number(self, solicitado_por='', anio=None):
+        """Reserva y devuelve el siguiente numero de SOLPED del anio"""
+        anio = anio or datetime.now().year
+        sheet_name = SOLPED_COUNTER_PREFIX + str(anio)
+        
+        base = self._get_base(anio, sheet_name)
+        
+        fila = self.sheets_handler.append_row_get_number(
+            self.sheet_id,
+            sheet_name,
+            [uuid.uuid4().hex[:12], datetime.now().strftime('%Y-%m-%d %H:%M:%S'), solicitado_por]
+        )
+        
+        numero = base + fila - 1
+        return "SOLPED-" + str(anio) + "-" + str(numero).zfill(3)
+    
+    def _get_base(self, anio, sheet_name):
+        key = (self.sheet_id, anio)
+        
+        with _bases_lock:
+            if key not in _bases:
+                _bases[key] = self._load_base(anio, sheet_name)
+            return _bases[key]
+    
+    def _load_base(self, anio, sheet_name):
+        """
+        Crea el contador del anio si no existe; si existe, lee su base.
+        La base se calcula antes de crear la hoja: una lectura fallida del
+        historial no deja un contador con base 0 ni una hoja sin B1.
+        """
+        if not self.sheets_handler.has_worksheet(self.sheet_id, sheet_name):
+            base = self._seed_base(anio)
+            
+            if self.sheets_handler.ensure_worksheet(self.sheet_id, sheet_name, rows=1, cols=3):
+                try:
+                    self.sheets_handler.update_values(self.sheet_id, sheet_name, 'A1', [['Base', base]])
+                except Exception:
+                    # Sin B1 el contador no sirve: se borra para que el proximo intento lo cree
+                    try:
+                        self.sheets_handler.delete_worksheet(self.sheet_id, sheet_name)
+                    except Exception as e:
+                        print("No se pudo borrar el contador " + sheet_name + ":", str(e))
+                    raise
+                
+                print("Contador SOLPED " + str(anio) + " creado con base " + str(base))
+                return base
+        
+        # Si otro proceso acaba de crear la hoja, esperar a que escriba la base
+        for intento in range(10):
+            valores = self.sheets_handler.get_values(self.sheet_id, sheet_name, 'B1')
+            if valores and valores[0] and str(valores[0][0]).strip() != '':
+                return int(float(valores[0][0]))
+            time.sleep(0.5)
+        
+        raise RuntimeError("El contador " + sheet_name + " no tiene base en B1")
+    
+    def _seed_base(self, anio):
+        """
+        Ultimo numero del anio en el historial. Solo se usa una vez al crear
+        el contador, para continuar la numeracion existente.
+        """
+        config = SHEETS_CONFIG['solped']
+        
+        # Un error se propaga: con una base 0 se repetirian numeros ya usados
+        df = self.sheets_handler.read_sheet_to_dataframe(
+            config['sheet_id'],
+            config['sheet_name'],
+            raise_errors=True
+        )
+        
+        if df.empty or 'SOLPED_Numero' not in df.columns:
+            return 0
+        
+        patron = re.compile(r'^SOLPED-' + str(anio) + r'-(\d+)$')
+        numeros = [
+            int(m.group(1))
+            for m in (patron.match(str(v).strip()) for v in df['SOLPED_Numero'])
+            if m
+        ]
+        
+        return max(numeros) if numeros else 0
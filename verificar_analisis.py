@@ -0,0 +1,123 @@
+"""
+Verificar analisis vectorizado contra el analisis fila por fila
+JAC Engineering SAS
+
+Uso:
+    python verificar_analisis.py [materiales]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.inventory_analyzer import InventoryAnalyzer
+from src.inventory_service import patch_analysis
+
+
+def generar_inventario(n):
+    """Inventario sintetico con los casos borde de la clasificacion"""
+    rng = np.random.default_rng(7)
+    
+    df = pd.DataFrame({
+        'codigo': [str(100000 + i) for i in range(n)],
+        'centro': rng.choice(['1001', '1002', '2001'], n),
+        'stock_actual': rng.integers(0, 120, n).astype(float),
+        'stock_minimo': rng.integers(0, 40, n).astype(float),
+        'stock_maximo': rng.integers(0, 100, n).astype(float),
+        'precio_unitario': rng.integers(100, 50000, n).astype(float),
+        'unidad': rng.choice(['UND', 'M', 'KG'], n).astype(object),
+        'criticidad': rng.choice(['A', 'B', 'C', 'X'], n).astype(object)
+    })
+    
+    # Medios (redondeo de :.0f), NaN, ceros y unidades vacias
+    df.loc[::7, 'stock_actual'] += 0.5
+    df.loc[::11, 'stock_maximo'] += 0.5
+    df.loc[::13, 'stock_minimo'] = np.nan
+    df.loc[::17, 'stock_maximo'] = np.nan
+    df.loc[::19, 'stock_actual'] = np.nan
+    df.loc[::23, 'stock_minimo'] = 0
+    df.loc[::29, 'unidad'] = np.nan
+    df.loc[::31, 'criticidad'] = np.nan
+    
+    df['valor_stock'] = df['stock_actual'] * df['precio_unitario']
+    return df
+
+
+def analisis_fila_por_fila(analyzer):
+    """Implementacion original con df.apply(axis=1), como referencia"""
+    df = analyzer.calculate_gaps()
+    
+    df['estado'] = df.apply(analyzer.classify_status, axis=1)
+    df['accion'] = df.apply(analyzer.generate_actions, axis=1)
+    df['cantidad_comprar'] = df.apply(analyzer.calculate_purchase_qty, axis=1)
+    df['valor_compra'] = df['cantidad_comprar'] * df['precio_unitario']
+    
+    priority_map = {'A': 1, 'B': 2, 'C': 3}
+    df['prioridad_num'] = df['criticidad'].map(priority_map).fillna(4)
+    
+    return df.sort_values(['estado', 'prioridad_num', 'brecha_minimo'])
+
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+print("=" * 60)
+print("  VERIFICACION DEL ANALISIS VECTORIZADO - " + str(n) + " materiales")
+print("=" * 60)
+
+data = generar_inventario(n)
+
+inicio = time.perf_counter()
+referencia = analisis_fila_por_fila(InventoryAnalyzer(data))
+t_filas = time.perf_counter() - inicio
+
+inicio = time.perf_counter()
+vectorizado = InventoryAnalyzer(data).full_analysis()
+t_vector = time.perf_counter() - inicio
+
+print("Fila por fila: " + str(round(t_filas, 3)) + " s")
+print("Vectorizado:   " + str(round(t_vector, 3)) + " s  (" + str(round(t_filas / t_vector, 1)) + "x)")
+print()
+
+errores = 0
+for col in ['estado', 'accion', 'cantidad_comprar', 'valor_compra', 'prioridad_num']:
+    iguales = referencia[col].astype(object).equals(vectorizado[col].astype(object))
+    print(("✓ " if iguales else "✗ ") + col)
+    errores += 0 if iguales else 1
+
+mismo_orden = referencia.index.equals(vectorizado.index)
+print(("✓ " if mismo_orden else "✗ ") + "orden de filas")
+errores += 0 if mismo_orden else 1
+
+# Parche incremental (una edicion de parametros) contra reconstruccion completa
+parche = data.iloc[::37][['codigo', 'centro']].copy()
+parche['stock_minimo'] = 35.0
+parche['criticidad'] = 'A'
+
+analyzer = InventoryAnalyzer(data)
+incremental, metricas_inc = patch_analysis(analyzer.full_analysis(), analyzer.get_summary_metrics(), parche)
+
+data_editada = data.copy()
+data_editada.loc[parche.index, ['stock_minimo', 'criticidad']] = parche[['stock_minimo', 'criticidad']]
+completo_analyzer = InventoryAnalyzer(data_editada)
+completo = completo_analyzer.full_analysis()
+metricas_completo = completo_analyzer.get_summary_metrics()
+
+iguales = (
+    incremental.index.equals(completo.index)
+    and incremental.astype(object).equals(completo.astype(object))
+)
+print(("✓ " if iguales else "✗ ") + "parche incremental (filas y orden)")
+errores += 0 if iguales else 1
+
+iguales = all(np.isclose(metricas_inc[k], metricas_completo[k]) for k in metricas_completo)
+print(("✓ " if iguales else "✗ ") + "parche incremental (metricas)")
+errores += 0 if iguales else 1
+
+print()
+if errores:
+    print("ERROR: " + str(errores) + " diferencias")
+    sys.exit(1)
+
+print("OK: resultados identicos")
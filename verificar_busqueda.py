@@ -0,0 +1,133 @@
+"""
+Verificar el indice de busqueda contra str.contains sobre los campos normalizados
+JAC Engineering SAS
+
+Uso:
+    python verificar_busqueda.py [materiales]
+"""
+
+import re
+import sys
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from src.search_index import SearchIndex, search_key, normalize_text, CLAVE_BUSQUEDA
+
+COLUMNAS = ['codigo', 'descripcion', 'nombre_tecnico', 'ubicacion', 'centro', 'centro_nombre']
+
+CONSULTAS = [
+    'a', 'ca', 'cañ', 'válvula', 'VÁLV', '10012', 'est-4', 'campo',
+    'x', 'zzzz', '1/2', '  motor ', 'r m', '1234 ', 'vfd',
+    'CAÑERIA', 'caneria', 'Cañería', 'ø1/2"', 'est 4', 'ELECTRICO-'
+]
+
+
+def generar_catalogo(n):
+    """Catalogo sintetico con acentos, simbolos, vacios y textos repetidos"""
+    rng = np.random.default_rng(11)
+    palabras = [
+        'variador', 'cañería', 'motor', 'tubo', 'válvula', 'bomba', 'cable',
+        'VFD', 'PVC', 'acero', 'inox', 'Ø1/2"', 'breaker', 'ELECTRICO', 'tornillo'
+    ]
+    
+    nombre = rng.choice(palabras, n).astype(object)
+    nombre[rng.random(n) < 0.3] = np.nan
+    
+    return pd.DataFrame({
+        'codigo': [str(100000 + i) for i in range(n)],
+        'descripcion': [' '.join(rng.choice(palabras, 3)) + ' ' + str(i % 997) for i in range(n)],
+        'nombre_tecnico': nombre,
+        'ubicacion': ['EST-' + str(i % 50) for i in range(n)],
+        'centro': rng.choice(['1001', '2001'], n),
+        'centro_nombre': 'CAMPO'
+    })
+
+
+def normalizar(texto):
+    """Normalizacion de referencia en Python puro (unicodedata + re)"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.category(c).startswith('M'))
+    return re.sub(r'[\W_]+', ' ', texto).strip()
+
+
+def buscar_con_contains(df, termino):
+    """Busqueda por recorrido: str.contains columna por columna sobre el texto normalizado"""
+    t = normalizar(termino)
+    mask = np.zeros(len(df), dtype=bool)
+    for col in COLUMNAS:
+        texto = df[col].astype(str).where(df[col].notna(), '').map(normalizar)
+        mask |= texto.str.contains(t, regex=False).to_numpy()
+    return np.flatnonzero(mask)
+
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+print("=" * 60)
+print("  VERIFICACION DEL INDICE DE BUSQUEDA - " + str(n) + " materiales")
+print("=" * 60)
+
+catalogo = generar_catalogo(n)
+
+inicio = time.perf_counter()
+catalogo[CLAVE_BUSQUEDA] = search_key(catalogo, COLUMNAS)
+print("Clave de busqueda en " + str(round(time.perf_counter() - inicio, 2)) + " s")
+
+inicio = time.perf_counter()
+indice = SearchIndex(catalogo, [CLAVE_BUSQUEDA])
+print("Indice construido en " + str(round(time.perf_counter() - inicio, 2)) + " s")
+print()
+
+errores = 0
+for consulta in CONSULTAS:
+    inicio = time.perf_counter()
+    filas = indice.candidates(consulta)
+    t_indice = (time.perf_counter() - inicio) * 1000
+    
+    inicio = time.perf_counter()
+    referencia = buscar_con_contains(catalogo, consulta)
+    t_contains = (time.perf_counter() - inicio) * 1000
+    
+    iguales = np.array_equal(filas, referencia)
+    errores += 0 if iguales else 1
+    print(
+        ("✓ " if iguales else "✗ ") + repr(consulta).ljust(12) +
+        str(len(filas)).rjust(8) + " filas  " +
+        str(round(t_indice, 2)).rjust(8) + " ms indice  " +
+        str(round(t_contains, 1)).rjust(8) + " ms recorrido"
+    )
+
+print()
+print("Ranking por paginas (ranked):")
+for consulta in ['a', 'motor', '10012', 'est 4']:
+    filas = indice.candidates(consulta)
+    
+    inicio = time.perf_counter()
+    primera, total = indice.ranked(consulta, 20)
+    t_pagina = (time.perf_counter() - inicio) * 1000
+    
+    paginas = [indice.ranked(consulta, 20, offset)[0] for offset in range(0, total, 20)]
+    todas = np.concatenate(paginas) if paginas else np.empty(0, dtype=np.int32)
+    niveles = indice._levels(normalize_text(consulta), todas)
+    
+    correcto = (
+        total == len(filas) and
+        np.array_equal(np.sort(todas), filas) and
+        np.array_equal(todas[:20], primera) and
+        bool(np.all(np.diff(niveles) >= 0))
+    )
+    errores += 0 if correcto else 1
+    print(
+        ("✓ " if correcto else "✗ ") + repr(consulta).ljust(12) +
+        str(total).rjust(8) + " filas  " +
+        str(round(t_pagina, 2)).rjust(8) + " ms primera pagina"
+    )
+
+print()
+if errores:
+    print("ERROR: " + str(errores) + " diferencias")
+    sys.exit(1)
+
+print("OK: resultados identicos")